@@ -0,0 +1,259 @@
+"""
+本地计算服务客户端与压力测试工具
+
+本模块用于：
+1. 向compute_server.py提交拟合和不确定度计算（TCP或Unix套接字，连接复用）
+2. 服务不可用时自动退回本地计算，调用方无需区分
+3. 以多个并发连接向服务发送请求，测量吞吐量和延迟分布
+
+图形界面程序在设置环境变量 LAB_COMPUTE_SERVER 后使用计算服务，取值如:
+    127.0.0.1:8765
+    unix:/tmp/lab_compute.sock
+
+压力测试:
+    python compute_client.py --concurrency 32 --requests 5000 --points 100
+
+作者: Cascade
+日期: 2025-03-26
+"""
+
+import os
+import sys
+import json
+import time
+import socket
+import asyncio
+import argparse
+import http.client
+
+import numpy as np
+
+from data_analysis import linear_fit, grouped_linear_fit, calculate_uncertainty
+
+DEFAULT_ADDRESS = "127.0.0.1:8765"
+
+# 服务地址环境变量
+ADDRESS_ENV = "LAB_COMPUTE_SERVER"
+
+# 复用的keep-alive连接已失效时的错误（可重连重试）
+STALE_CONNECTION_ERRORS = (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError)
+
+
+def parse_address(address):
+    """解析服务地址，返回 (host, port, unix_path)"""
+    if address.startswith("unix:"):
+        return None, None, address[len("unix:"):]
+    host, _, port = address.rpartition(":")
+    return host or "127.0.0.1", int(port), None
+
+
+def from_json(value):
+    """还原服务端的编码："nan"/"inf"/"-inf"→浮点数，数值列表→numpy数组（列表中的null→nan），其余null→None"""
+    if isinstance(value, dict):
+        return {key: from_json(item) for key, item in value.items()}
+    if isinstance(value, list):
+        items = [from_json(item) for item in value]
+        if items and all(isinstance(item, int) and not isinstance(item, bool) for item in items):
+            return np.array(items)
+        if any(isinstance(item, (int, float)) for item in items) \
+                and all(item is None or isinstance(item, (int, float)) for item in items):
+            return np.array([np.nan if item is None else item for item in items], dtype=float)
+        return items
+    if value in ("nan", "inf", "-inf"):
+        return float(value)
+    return value
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    """通过Unix套接字通信的HTTP连接"""
+
+    def __init__(self, path, timeout=30):
+        super().__init__("localhost", timeout=timeout)
+        self.unix_path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.unix_path)
+
+
+class ServiceError(ValueError):
+    """计算服务返回的错误（请求参数错误等）"""
+
+
+class ComputeClient:
+    """计算服务客户端；fallback为True时服务不可用则在本地计算"""
+
+    def __init__(self, address=DEFAULT_ADDRESS, timeout=30, fallback=True):
+        self.host, self.port, self.unix_path = parse_address(address)
+        self.timeout = timeout
+        self.fallback = fallback
+        self._connection = None
+
+    @classmethod
+    def from_env(cls, **kwargs):
+        """按环境变量LAB_COMPUTE_SERVER创建客户端，未设置时返回None"""
+        address = os.environ.get(ADDRESS_ENV)
+        return cls(address, **kwargs) if address else None
+
+    def _connect(self):
+        if self._connection is None:
+            if self.unix_path:
+                self._connection = UnixHTTPConnection(self.unix_path, self.timeout)
+            else:
+                self._connection = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        return self._connection
+
+    def request(self, method, path, payload=None):
+        """
+        发送请求并返回解码后的响应
+
+        只有复用的keep-alive连接已被服务端关闭时才重连重试一次；超时等其他错误直接抛出，
+        由调用方退回本地计算，不会重复发送请求。
+        """
+        body = None if payload is None else json.dumps(payload).encode("utf-8")
+        headers = {"Content-Type": "application/json"}
+        while True:
+            reused = self._connection is not None
+            connection = self._connect()
+            try:
+                connection.request(method, path, body, headers)
+                response = connection.getresponse()
+                data = json.loads(response.read())
+                break
+            except STALE_CONNECTION_ERRORS:
+                self.close()
+                if not reused:
+                    raise
+            except (OSError, http.client.HTTPException):
+                self.close()
+                raise
+        if response.status != 200:
+            raise ServiceError(data.get("error", f"HTTP {response.status}"))
+        return from_json(data)
+
+    def fit(self, x_values, y_values, series=None):
+        """最小二乘拟合；给出series时按系列分组拟合，结果格式与data_analysis中对应函数一致"""
+        payload = {"x": np.asarray(x_values, dtype=float).tolist(),
+                   "y": np.asarray(y_values, dtype=float).tolist()}
+        if series is not None:
+            payload["series"] = np.asarray(series).tolist()
+        try:
+            result = self.request("POST", "/fit", payload)
+        except (OSError, http.client.HTTPException):
+            if not self.fallback:
+                raise
+        else:
+            # JSON没有元组，自由度还原为与本地计算相同的(df1, df2)
+            if series is not None and result["slope_equality"] is not None:
+                result["slope_equality"]["df"] = tuple(int(df) for df in result["slope_equality"]["df"])
+            return result
+        if series is not None:
+            return grouped_linear_fit(x_values, y_values, series)
+        return linear_fit(x_values, y_values)
+
+    def uncertainty(self, data_values, instrument_precision=0.0, distribution="均匀分布",
+                    confidence_factor=2.0, confidence_level=None, type_b_dof=np.inf):
+        """不确定度计算，参数和结果格式与data_analysis.calculate_uncertainty一致"""
+        payload = {
+            "values": np.asarray(data_values, dtype=float).tolist(),
+            "instrument_precision": instrument_precision,
+            "distribution": distribution,
+            "confidence_factor": confidence_factor,
+            "confidence_level": confidence_level,
+            "type_b_dof": None if np.isinf(type_b_dof) else type_b_dof,
+        }
+        try:
+            return self.request("POST", "/uncertainty", payload)
+        except (OSError, http.client.HTTPException):
+            if not self.fallback:
+                raise
+        return calculate_uncertainty(data_values, instrument_precision, distribution,
+                                     confidence_factor, confidence_level, type_b_dof)
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+
+async def _load_worker(address, bodies, latencies, errors):
+    """一个并发连接：顺序发送分配到的请求（keep-alive）并记录每个请求的延迟"""
+    host, port, unix_path = parse_address(address)
+    if unix_path:
+        reader, writer = await asyncio.open_unix_connection(unix_path)
+    else:
+        reader, writer = await asyncio.open_connection(host, port)
+    try:
+        for path, body in bodies:
+            start = time.perf_counter()
+            writer.write(
+                f"POST {path} HTTP/1.1\r\nHost: localhost\r\n"
+                f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n".encode("latin-1")
+                + body)
+            await writer.drain()
+            status_line = await reader.readline()
+            length = 0
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b"\n", b""):
+                    break
+                name, _, value = line.decode("latin-1").partition(":")
+                if name.strip().lower() == "content-length":
+                    length = int(value)
+            await reader.readexactly(length)
+            latencies.append(time.perf_counter() - start)
+            if b" 200 " not in status_line:
+                errors.append(status_line.decode("latin-1").strip())
+    finally:
+        writer.close()
+
+
+async def run_load(address, concurrency, requests, points, kind, seed=0):
+    """以concurrency个连接共发送requests个请求，返回 (总耗时, 延迟列表, 错误列表)"""
+    rng = np.random.default_rng(seed)
+    bodies = []
+    for i in range(requests):
+        request_kind = kind if kind != "mixed" else ("fit", "uncertainty")[i % 2]
+        if request_kind == "fit":
+            x_array = np.linspace(0, 10, points)
+            y_array = 2 * x_array + 1 + rng.normal(0, 0.1, points)
+            payload = {"x": x_array.tolist(), "y": y_array.tolist()}
+        else:
+            payload = {"values": rng.normal(1, 0.01, points).tolist(), "instrument_precision": 0.01}
+        bodies.append((f"/{request_kind}", json.dumps(payload).encode("utf-8")))
+
+    latencies, errors = [], []
+    start = time.perf_counter()
+    await asyncio.gather(*(_load_worker(address, bodies[i::concurrency], latencies, errors)
+                           for i in range(concurrency)))
+    return time.perf_counter() - start, latencies, errors
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="计算服务压力测试")
+    parser.add_argument("--address", default=os.environ.get(ADDRESS_ENV, DEFAULT_ADDRESS),
+                        help="服务地址，如 127.0.0.1:8765 或 unix:/tmp/lab_compute.sock")
+    parser.add_argument("--concurrency", type=int, default=32, help="并发连接数")
+    parser.add_argument("--requests", type=int, default=2000, help="请求总数")
+    parser.add_argument("--points", type=int, default=100, help="每个请求的数据点数")
+    parser.add_argument("--kind", choices=("fit", "uncertainty", "mixed"), default="mixed", help="请求类型")
+    args = parser.parse_args(argv)
+
+    elapsed, latencies, errors = asyncio.run(
+        run_load(args.address, args.concurrency, args.requests, args.points, args.kind))
+    latencies = np.array(latencies) * 1000
+    print(f"请求数: {len(latencies)}，并发连接: {args.concurrency}，每请求数据点: {args.points}")
+    print(f"总耗时: {elapsed:.3f} s，吞吐量: {len(latencies) / elapsed:.1f} 请求/秒")
+    print("延迟(ms): 平均 {:.2f}，p50 {:.2f}，p95 {:.2f}，p99 {:.2f}".format(
+        latencies.mean(), *np.percentile(latencies, [50, 95, 99])))
+    if errors:
+        print(f"失败请求: {len(errors)}（如 {errors[0]}）", file=sys.stderr)
+
+    stats = ComputeClient(args.address, fallback=False).request("GET", "/stats")
+    print(f"服务端平均批大小: {stats['mean_batch_size']:.1f}")
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,366 @@
+"""
+本地计算服务
+
+本程序用于在实验室工作站上常驻一个计算进程，供多个客户端（无界面脚本、两个图形界面程序）共用：
+1. 启动时预先导入numpy/scipy并预热计算，客户端无需各自承担启动开销
+2. 通过HTTP（TCP或Unix套接字）提供最小二乘拟合和不确定度计算，返回JSON
+3. 把短时间内到达的并发请求合并为一批（micro-batching），用一次向量化调用算完
+
+接口（POST请求体和响应均为JSON）:
+    POST /fit           {"x": [...], "y": [...], "series": [...]（可选）}
+    POST /uncertainty   {"values": [...], "instrument_precision": 0.0, "distribution": "均匀分布",
+                         "confidence_level": 0.9545（为null时使用confidence_factor）,
+                         "confidence_factor": 2.0, "type_b_dof": null（null表示∞）}
+    GET  /health        服务状态
+    GET  /stats         请求数、批次数、平均批大小
+
+启动:
+    python compute_server.py [--host 127.0.0.1] [--port 8765] [--unix 套接字路径]
+
+非有限浮点数按 nan→"nan"、±inf→"inf"/"-inf" 编码，以保证输出为合法JSON；null只表示None（如手动k时的confidence_level）。
+
+作者: Cascade
+日期: 2025-03-26
+"""
+
+import sys
+import json
+import math
+import asyncio
+import argparse
+from collections import defaultdict
+
+import numpy as np
+
+from data_analysis import linear_fit, grouped_linear_fit, batch_uncertainty, calculate_uncertainty
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+
+# 每批最多合并的请求数，以及第一个请求到达后最多等待的时间（秒）
+MAX_BATCH = 256
+MAX_DELAY = 0.002
+
+# 请求体大小上限（字节）
+MAX_BODY = 64 * 1024 * 1024
+
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+           413: "Payload Too Large", 500: "Internal Server Error"}
+
+FIT_KEYS = ("slope", "intercept", "slope_uncertainty", "intercept_uncertainty", "r_squared", "residual_std")
+UNCERTAINTY_KEYS = ("mean", "std_dev", "ua", "ub", "uc", "dof_eff", "confidence_factor", "ue")
+
+
+def to_json(value):
+    """把numpy类型和非有限浮点数转换为可JSON序列化的值"""
+    if isinstance(value, dict):
+        return {key: to_json(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple, np.ndarray)):
+        return [to_json(item) for item in value]
+    if isinstance(value, (np.integer, np.bool_)):
+        return value.item()
+    if isinstance(value, (float, np.floating)):
+        value = float(value)
+        if math.isnan(value):
+            return "nan"
+        if math.isinf(value):
+            return "inf" if value > 0 else "-inf"
+        return value
+    return value
+
+
+def parse_fit(payload):
+    """校验拟合请求，返回 (x数组, y数组, series数组或None)"""
+    x_array = np.asarray(payload["x"], dtype=float)
+    y_array = np.asarray(payload["y"], dtype=float)
+    if x_array.ndim != 1 or x_array.shape != y_array.shape:
+        raise ValueError("x和y必须是长度相同的一维数组")
+    if len(x_array) < 2:
+        raise ValueError("至少需要2个数据点才能进行拟合")
+    series = payload.get("series")
+    if series is not None:
+        series = np.asarray(series)
+        if series.shape != x_array.shape:
+            raise ValueError("series长度必须与x相同")
+    return x_array, y_array, series
+
+
+def parse_uncertainty(payload):
+    """校验不确定度请求，返回规范化后的参数字典"""
+    values = np.asarray(payload["values"], dtype=float)
+    if values.ndim != 1 or len(values) < 2:
+        raise ValueError("至少需要2个数据点才能计算不确定度")
+    confidence_level = payload.get("confidence_level", 0.9545)
+    if confidence_level is not None:
+        confidence_level = float(confidence_level)
+        if not 0 < confidence_level < 1:
+            raise ValueError("confidence_level必须在0和1之间")
+    confidence_factor = payload.get("confidence_factor", 2.0)
+    if confidence_level is None and confidence_factor is None:
+        raise ValueError("confidence_level和confidence_factor不能同时为null")
+    # 给出置信水平时k由有效自由度计算，confidence_factor不参与计算
+    confidence_factor = np.nan if confidence_factor is None else float(confidence_factor)
+    type_b_dof = payload.get("type_b_dof")
+    type_b_dof = np.inf if type_b_dof is None else float(type_b_dof)
+    if type_b_dof <= 0:
+        raise ValueError("type_b_dof必须为正数")
+    return {
+        "values": values,
+        "instrument_precision": float(payload.get("instrument_precision", 0.0)),
+        "distribution": str(payload.get("distribution", "均匀分布")),
+        "confidence_level": confidence_level,
+        "confidence_factor": confidence_factor,
+        "type_b_dof": type_b_dof,
+    }
+
+
+def _process_fits(items, results):
+    """无系列的拟合请求拼成一个数组，以请求序号为组一次分组拟合；有系列的请求单独分组拟合"""
+    plain = []
+    for index, (x_array, y_array, series) in items:
+        if series is None:
+            plain.append((index, x_array, y_array))
+        else:
+            results[index] = (200, grouped_linear_fit(x_array, y_array, series))
+    if not plain:
+        return
+
+    lengths = [len(x_array) for _, x_array, _ in plain]
+    labels = np.repeat(np.arange(len(plain)), lengths)
+    fitted = grouped_linear_fit(np.concatenate([x for _, x, _ in plain]),
+                                np.concatenate([y for _, _, y in plain]),
+                                labels, slope_test=False)
+    for i, (index, _, _) in enumerate(plain):
+        if not np.isfinite(fitted["slope"][i]):
+            results[index] = (400, {"error": "所有X值相同，无法拟合直线"})
+            continue
+        result = {"n": int(fitted["n"][i])}
+        result.update({key: float(fitted[key][i]) for key in FIT_KEYS})
+        results[index] = (200, result)
+
+
+def _process_uncertainties(items, results):
+    """按(分布, 置信水平)分桶，每桶一次batch_uncertainty"""
+    buckets = defaultdict(list)
+    for index, params in items:
+        buckets[(params["distribution"], params["confidence_level"])].append((index, params))
+
+    for (distribution, confidence_level), bucket in buckets.items():
+        lengths = [len(params["values"]) for _, params in bucket]
+        computed = batch_uncertainty(
+            np.concatenate([params["values"] for _, params in bucket]),
+            np.repeat(np.arange(len(bucket)), lengths),
+            np.array([params["instrument_precision"] for _, params in bucket]),
+            distribution,
+            confidence_level,
+            np.array([params["type_b_dof"] for _, params in bucket]),
+            np.array([params["confidence_factor"] for _, params in bucket]),
+        )
+        for i, (index, _) in enumerate(bucket):
+            result = {"n": int(computed["n"][i])}
+            result.update({key: float(computed[key][i]) for key in UNCERTAINTY_KEYS})
+            result.update({"distribution": distribution, "confidence_level": confidence_level})
+            results[index] = (200, result)
+
+
+def process_batch(requests):
+    """
+    计算一批请求，requests为 [(类型, 请求JSON), ...]，返回等长的 [(状态码, 响应JSON), ...]
+
+    单个请求的参数错误只影响该请求；批量计算失败时退回逐个计算，避免一个请求拖垮整批。
+    """
+    results = [None] * len(requests)
+    fits, uncertainties = [], []
+    for index, (kind, payload) in enumerate(requests):
+        try:
+            if kind == "fit":
+                fits.append((index, parse_fit(payload)))
+            else:
+                uncertainties.append((index, parse_uncertainty(payload)))
+        except (KeyError, TypeError, ValueError) as e:
+            results[index] = (400, {"error": f"请求参数错误: {e}"})
+
+    try:
+        _process_fits(fits, results)
+        _process_uncertainties(uncertainties, results)
+    except Exception:
+        for index, (kind, payload) in enumerate(requests):
+            if results[index] is None:
+                results[index] = process_single(kind, payload)
+    return [(status, to_json(payload)) for status, payload in results]
+
+
+def process_single(kind, payload):
+    """单独计算一个请求（批量计算失败时使用）"""
+    try:
+        if kind == "fit":
+            x_array, y_array, series = parse_fit(payload)
+            if series is not None:
+                return 200, grouped_linear_fit(x_array, y_array, series)
+            return 200, linear_fit(x_array, y_array)
+        params = parse_uncertainty(payload)
+        return 200, calculate_uncertainty(
+            params["values"], params["instrument_precision"], params["distribution"],
+            params["confidence_factor"], params["confidence_level"], params["type_b_dof"])
+    except (KeyError, TypeError, ValueError) as e:
+        return 400, {"error": str(e)}
+    except Exception as e:
+        return 500, {"error": f"计算错误: {e}"}
+
+
+def warm_up():
+    """预先导入并执行一次各计算路径，使首个请求不承担导入和初始化开销"""
+    from scipy import stats  # noqa: F401  斜率检验和非常用置信水平会用到
+    process_batch([
+        ("fit", {"x": [1, 2, 3], "y": [1, 2, 3.1]}),
+        ("fit", {"x": [1, 2, 3, 1, 2, 3], "y": [1, 2, 3, 2, 4, 6], "series": [1, 1, 1, 2, 2, 2]}),
+        ("uncertainty", {"values": [1.0, 1.1, 0.9]}),
+    ])
+
+
+class ComputeServer:
+    """asyncio计算服务：HTTP请求进入队列，由批处理协程合并后在线程池中计算"""
+
+    def __init__(self, max_batch=MAX_BATCH, max_delay=MAX_DELAY):
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.queue = None
+        self.requests = 0
+        self.batches = 0
+
+    async def submit(self, kind, payload):
+        """提交一个计算请求并等待结果，返回 (状态码, 响应JSON)"""
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((kind, payload, future))
+        return await future
+
+    async def batch_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.max_delay
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            while len(batch) < self.max_batch and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+
+            # 计算在线程池中进行，期间到达的请求在队列中积累为下一批
+            try:
+                results = await loop.run_in_executor(
+                    None, process_batch, [(kind, payload) for kind, payload, _ in batch])
+            except Exception as e:
+                results = [(500, {"error": f"计算错误: {e}"})] * len(batch)
+            self.requests += len(batch)
+            self.batches += 1
+            for (_, _, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+
+    async def dispatch(self, method, path, body):
+        """路由请求，返回 (状态码, 响应JSON)"""
+        path = path.split("?", 1)[0]
+        if path == "/health":
+            return 200, {"status": "ok"}
+        if path == "/stats":
+            return 200, {
+                "requests": self.requests,
+                "batches": self.batches,
+                "mean_batch_size": self.requests / self.batches if self.batches else 0.0,
+                "queued": self.queue.qsize(),
+            }
+        if path not in ("/fit", "/uncertainty"):
+            return 404, {"error": f"未知路径: {path}"}
+        if method != "POST":
+            return 405, {"error": "请使用POST请求"}
+        try:
+            payload = json.loads(body)
+        except ValueError as e:
+            return 400, {"error": f"JSON解析错误: {e}"}
+        if not isinstance(payload, dict):
+            return 400, {"error": "请求体必须是JSON对象"}
+        return await self.submit(path.lstrip("/"), payload)
+
+    async def handle_connection(self, reader, writer):
+        """处理一个HTTP/1.1连接（支持keep-alive）"""
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, path, version = request_line.decode("latin-1").split()
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                length = int(headers.get("content-length", 0))
+                if length > MAX_BODY:
+                    status, payload = 413, {"error": "请求体过大"}
+                    keep_alive = False
+                else:
+                    body = await reader.readexactly(length) if length else b""
+                    status, payload = await self.dispatch(method, path, body)
+                    keep_alive = (version == "HTTP/1.1"
+                                  and headers.get("connection", "").lower() != "close")
+
+                data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+                writer.write(
+                    f"HTTP/1.1 {status} {REASONS[status]}\r\n"
+                    "Content-Type: application/json; charset=utf-8\r\n"
+                    f"Content-Length: {len(data)}\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode("latin-1")
+                    + data)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host=DEFAULT_HOST, port=DEFAULT_PORT, unix_path=None):
+        self.queue = asyncio.Queue()
+        batcher = asyncio.create_task(self.batch_loop())
+        if unix_path:
+            server = await asyncio.start_unix_server(self.handle_connection, path=unix_path)
+            address = unix_path
+        else:
+            server = await asyncio.start_server(self.handle_connection, host, port)
+            address = f"http://{host}:{port}"
+        print(f"计算服务已启动: {address}", flush=True)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            batcher.cancel()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="本地最小二乘拟合/不确定度计算服务")
+    parser.add_argument("--host", default=DEFAULT_HOST, help="监听地址")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="监听端口")
+    parser.add_argument("--unix", default=None, help="改为监听Unix套接字路径")
+    parser.add_argument("--max-batch", type=int, default=MAX_BATCH, help="每批最多合并的请求数")
+    parser.add_argument("--max-delay-ms", type=float, default=MAX_DELAY * 1000, help="合并请求的最长等待时间（毫秒）")
+    args = parser.parse_args(argv)
+
+    warm_up()
+    server = ComputeServer(args.max_batch, args.max_delay_ms / 1000)
+    try:
+        asyncio.run(server.serve(args.host, args.port, args.unix))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,361 @@
+"""
+数据处理计算核心
+
+本模块把两个图形界面程序中的纯数值计算提取出来，供以下场景共用：
+1. least_squares_fit.py 与 uncertainty_calculator.py 的界面计算
+2. 后台进程中的图表/报告批量导出
+3. 不依赖tkinter的脚本调用
+
+作者: Cascade
+日期: 2025-03-26
+"""
+
+import numpy as np
+
+# B类不确定度分布对应的除数：u_B = a / 除数
+DISTRIBUTION_DIVISORS = {
+    "均匀分布": np.sqrt(3),
+    "正态分布": 3.0,
+    "三角分布": np.sqrt(6),
+}
+
+# t分布双侧分位数表 t_{(1+p)/2}(ν)，用于由有效自由度求包含因子k，避免每次计算都调用scipy。
+# 每个置信水平p对应T_TABLE_DOF中各自由度的分位数，最后一项为ν→∞（正态分布）。
+# 在1/ν上对ln t做线性插值，ν≥1范围内相对误差小于0.12%。
+T_TABLE_DOF = (
+    1, 1.1, 1.2, 1.3, 1.4, 1.5, 1.6, 1.8, 2, 2.25,
+    2.5, 2.75, 3, 3.5, 4, 4.5, 5, 6, 7, 8,
+    9, 10, 12, 14, 16, 18, 20, 25, 30, 40,
+    50, 60, 80, 100, 150, 200, 500,
+)
+T_TABLE = {
+    0.6827: (
+        1.83741, 1.72431, 1.63735, 1.56855, 1.51284, 1.46686, 1.42829, 1.36731,
+        1.32132, 1.27767, 1.24435, 1.21811, 1.19691, 1.16481, 1.14165, 1.12418,
+        1.11053, 1.09059, 1.07674, 1.06655, 1.05875, 1.05259, 1.04346, 1.03704,
+        1.03226, 1.02858, 1.02566, 1.02043, 1.01697, 1.01268, 1.01012, 1.00843,
+        1.00631, 1.00505, 1.00337, 1.00253, 1.00102, 1.00002,
+    ),
+    0.9: (
+        6.31375, 5.42384, 4.7958, 4.33334, 3.98105, 3.70518, 3.48415, 3.15373,
+        2.91999, 2.71032, 2.55822, 2.4432, 2.35336, 2.22243, 2.13185, 2.06558,
+        2.01505, 1.94318, 1.89458, 1.85955, 1.83311, 1.81246, 1.78229, 1.76131,
+        1.74588, 1.73406, 1.72472, 1.70814, 1.69726, 1.68385, 1.67591, 1.67065,
+        1.66412, 1.66023, 1.65508, 1.65251, 1.64791, 1.64485,
+    ),
+    0.95: (
+        12.7062, 10.2768, 8.64883, 7.50053, 6.657, 6.01666, 5.51725, 4.79488,
+        4.30265, 3.87548, 3.57465, 3.35255, 3.18245, 2.94009, 2.77645, 2.65891,
+        2.57058, 2.44691, 2.36462, 2.306, 2.26216, 2.22814, 2.17881, 2.14479,
+        2.11991, 2.10092, 2.08596, 2.05954, 2.04227, 2.02108, 2.00856, 2.0003,
+        1.99006, 1.98397, 1.97591, 1.9719, 1.96472, 1.95996,
+    ),
+    0.9545: (
+        13.9678, 11.203, 9.36346, 8.07362, 7.13085, 6.41822, 5.86446, 5.06711,
+        4.52655, 4.05955, 3.732, 3.49094, 3.30683, 3.04531, 2.86932, 2.74323,
+        2.64865, 2.51653, 2.42881, 2.36642, 2.31981, 2.28368, 2.23135, 2.19529,
+        2.16894, 2.14885, 2.13303, 2.10509, 2.08685, 2.06446, 2.05125, 2.04253,
+        2.03174, 2.02531, 2.01681, 2.01258, 2.00501, 2,
+    ),
+    0.99: (
+        63.6567, 44.5378, 33.239, 26.0576, 21.2248, 17.8203, 15.3309, 12.0007,
+        9.92484, 8.25818, 7.16373, 6.39972, 5.84091, 5.0857, 4.60409, 4.27282,
+        4.03214, 3.70743, 3.49948, 3.35539, 3.24984, 3.16927, 3.05454, 2.97684,
+        2.92078, 2.87844, 2.84534, 2.78744, 2.75, 2.70446, 2.67779, 2.66028,
+        2.63869, 2.62589, 2.609, 2.60063, 2.5857, 2.57583,
+    ),
+    0.9973: (
+        235.784, 146.469, 99.0047, 71.3834, 54.127, 42.7179, 34.8196, 24.9254,
+        19.206, 14.9051, 12.2418, 10.4676, 9.2187, 7.60286, 6.62007, 5.96781,
+        5.50698, 4.90399, 4.52991, 4.27658, 4.0942, 3.95689, 3.76424, 3.63576,
+        3.54409, 3.47544, 3.42212, 3.3296, 3.2703, 3.19874, 3.15712, 3.12991,
+        3.09648, 3.07673, 3.05075, 3.03791, 3.01505, 2.99998,
+    ),
+}
+
+_T_TABLE_X = np.concatenate([[0.0], 1.0 / np.array(T_TABLE_DOF[::-1])])
+_T_TABLE_LOG = {level: np.log(np.concatenate([values[-1:], values[-2::-1]]))
+                for level, values in T_TABLE.items()}
+
+
+def linear_fit(x_values, y_values):
+    """对(x,y)数据做最小二乘线性拟合，返回拟合参数及其不确定度"""
+    x_array = np.asarray(x_values, dtype=float)
+    y_array = np.asarray(y_values, dtype=float)
+    n = len(x_array)
+    if n < 2:
+        raise ValueError("至少需要2个数据点才能进行拟合")
+
+    # 中心化后计算，避免大数相减损失精度
+    x_mean = np.mean(x_array)
+    y_mean = np.mean(y_array)
+    dx = x_array - x_mean
+    dy = y_array - y_mean
+    return fit_from_moments(n, x_mean, y_mean, np.dot(dx, dx), np.dot(dy, dy), np.dot(dx, dy))
+
+
+def fit_from_moments(n, x_mean, y_mean, sxx, syy, sxy):
+    """
+    由充分统计量计算拟合结果
+
+    Sxx = ∑(x-x̄)²，Syy = ∑(y-ȳ)²，Sxy = ∑(x-x̄)(y-ȳ)；内存计算和分块流式计算共用此公式。
+    """
+    if n < 2:
+        raise ValueError("至少需要2个数据点才能进行拟合")
+    if sxx == 0:
+        raise ValueError("所有X值相同，无法拟合直线")
+
+    slope = sxy / sxx
+    intercept = y_mean - slope * x_mean
+
+    # 残差平方和与残差标准差
+    residual_sum_squares = max(syy - slope * sxy, 0.0)
+    residual_std = np.sqrt(residual_sum_squares / (n - 2)) if n > 2 else np.nan
+
+    # n∑(x²) - (∑x)² = n·Sxx，∑(x²) = Sxx + n·x̄²
+    slope_uncertainty = residual_std * np.sqrt(1.0 / sxx)
+    intercept_uncertainty = residual_std * np.sqrt((sxx + n * x_mean**2) / (n * sxx))
+
+    r_squared = sxy**2 / (sxx * syy) if syy > 0 else 1.0
+
+    return {
+        "n": int(n),
+        "slope": float(slope),
+        "intercept": float(intercept),
+        "slope_uncertainty": float(slope_uncertainty),
+        "intercept_uncertainty": float(intercept_uncertainty),
+        "r_squared": float(r_squared),
+        "residual_std": float(residual_std),
+    }
+
+
+def type_b_uncertainty(instrument_precision, distribution="均匀分布"):
+    """由仪器精度和分布类型计算B类不确定度，未知分布按均匀分布处理"""
+    divisor = DISTRIBUTION_DIVISORS.get(distribution, DISTRIBUTION_DIVISORS["均匀分布"])
+    return instrument_precision / divisor
+
+
+def coverage_factor(dof, confidence_level=0.9545):
+    """
+    由自由度求t分布包含因子k = t_{(1+p)/2}(ν)，支持数组输入，ν为inf时取正态分布分位数
+
+    表中的置信水平直接查表插值；其他置信水平才退回scipy.stats.t.ppf。
+    """
+    dof = np.maximum(np.asarray(dof, dtype=float), 1.0)
+    if confidence_level in _T_TABLE_LOG:
+        k = np.exp(np.interp(1.0 / dof, _T_TABLE_X, _T_TABLE_LOG[confidence_level]))
+    else:
+        from scipy import stats  # 仅在非常用置信水平时导入
+        k = stats.t.ppf((1 + confidence_level) / 2, dof)
+    return k if k.ndim else float(k)
+
+
+def welch_satterthwaite(uc, ua, dof_a, ub, dof_b=np.inf):
+    """
+    Welch–Satterthwaite有效自由度 ν_eff = u_c⁴ / (u_A⁴/ν_A + u_B⁴/ν_B)，支持数组输入
+
+    B类自由度默认为无穷大（B类评定完全可靠），此时该项为0。
+    """
+    uc, ua, ub = (np.asarray(v, dtype=float) for v in (uc, ua, ub))
+    dof_a = np.asarray(dof_a, dtype=float)
+    dof_b = np.asarray(dof_b, dtype=float)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        denominator = ua**4 / dof_a + np.where(np.isinf(dof_b), 0.0, ub**4 / dof_b)
+        dof_eff = np.where(denominator > 0, uc**4 / denominator, np.inf)
+    return dof_eff if dof_eff.ndim else float(dof_eff)
+
+
+def uncertainty_sweep(std_dev, sample_sizes, instrument_precisions, distributions=("均匀分布",),
+                      confidence_factors=(2.0,)):
+    """
+    不确定度参数扫描：对 n × 仪器精度 × 分布 × k 的笛卡尔积一次广播计算
+
+    std_dev为样本标准差，u_A = s / √n。返回字典中的数组依次对应
+    (n, 仪器精度, 分布, k) 四个轴，只有相关的轴展开：
+    ua为(N,1,1,1)，ub为(1,P,D,1)，uc为(N,P,D,1)，U为(N,P,D,K)。
+    """
+    n = np.asarray(sample_sizes, dtype=float).reshape(-1, 1, 1, 1)
+    precision = np.asarray(instrument_precisions, dtype=float).reshape(1, -1, 1, 1)
+    divisors = np.array([DISTRIBUTION_DIVISORS.get(d, DISTRIBUTION_DIVISORS["均匀分布"])
+                         for d in distributions]).reshape(1, 1, -1, 1)
+    k = np.asarray(confidence_factors, dtype=float).reshape(1, 1, 1, -1)
+
+    ua = std_dev / np.sqrt(n)
+    ub = precision / divisors
+    uc = np.sqrt(ua**2 + ub**2)
+    return {"ua": ua, "ub": ub, "uc": uc, "U": k * uc}
+
+
+def calculate_uncertainty(data_values, instrument_precision=0.0, distribution="均匀分布",
+                          confidence_factor=2.0, confidence_level=None, type_b_dof=np.inf):
+    """
+    计算一组数据的A类、B类、合成及扩展不确定度
+
+    给出confidence_level时，包含因子k由Welch–Satterthwaite有效自由度查t分布表得到，
+    confidence_factor被忽略；否则直接使用confidence_factor。
+    """
+    data_array = np.asarray(data_values, dtype=float)
+    n = len(data_array)
+    if n < 2:
+        raise ValueError("至少需要2个数据点才能计算不确定度")
+
+    mean_value = np.mean(data_array)
+    deviation = data_array - mean_value
+    return uncertainty_from_moments(n, mean_value, np.dot(deviation, deviation), instrument_precision,
+                                    distribution, confidence_factor, confidence_level, type_b_dof)
+
+
+def uncertainty_from_moments(n, mean_value, m2, instrument_precision=0.0, distribution="均匀分布",
+                             confidence_factor=2.0, confidence_level=None, type_b_dof=np.inf):
+    """由充分统计量（n、均值、M2 = ∑(x-x̄)²）计算不确定度；内存计算和分块流式计算共用此公式"""
+    if n < 2:
+        raise ValueError("至少需要2个数据点才能计算不确定度")
+
+    std_dev = np.sqrt(m2 / (n - 1))  # 样本标准差（无偏估计）
+    ua = std_dev / np.sqrt(n)
+    ub = type_b_uncertainty(instrument_precision, distribution)
+    uc = np.sqrt(ua**2 + ub**2)
+    dof_eff = welch_satterthwaite(uc, ua, n - 1, ub, type_b_dof)
+    if confidence_level is not None:
+        confidence_factor = coverage_factor(dof_eff, confidence_level)
+    ue = confidence_factor * uc
+
+    return {
+        "n": int(n),
+        "mean": float(mean_value),
+        "std_dev": float(std_dev),
+        "ua": float(ua),
+        "ub": float(ub),
+        "uc": float(uc),
+        "ue": float(ue),
+        "distribution": distribution,
+        "confidence_factor": float(confidence_factor),
+        "confidence_level": confidence_level,
+        "dof_eff": dof_eff,
+    }
+
+
+def batch_uncertainty(values, sets, instrument_precision=0.0, distribution="均匀分布",
+                      confidence_level=0.9545, type_b_dof=np.inf, confidence_factor=2.0):
+    """
+    批量计算多组测量的不确定度：所有数据放在一个数组中，sets给出每个数据所属的测量组
+
+    各组的均值、标准差用分段归约（bincount）一次算出，有效自由度和包含因子也向量化计算。
+    instrument_precision、type_b_dof、confidence_factor可为标量或按组排序的数组；
+    confidence_level为None时使用confidence_factor作为k。返回字典，各量为按组标签排序的数组，
+    数据点少于2个的组除n、mean、ub外均为nan。
+    """
+    values = np.asarray(values, dtype=float)
+    labels, inverse = np.unique(np.asarray(sets), return_inverse=True)
+    inverse = inverse.ravel()
+    groups = len(labels)
+
+    counts = np.bincount(inverse, minlength=groups)
+    mean = np.bincount(inverse, values, groups) / counts
+    deviation = values - mean[inverse]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        std_dev = np.sqrt(np.bincount(inverse, deviation * deviation, groups) / (counts - 1))
+        std_dev[counts < 2] = np.nan
+        ua = std_dev / np.sqrt(counts)
+    ub = np.broadcast_to(type_b_uncertainty(np.asarray(instrument_precision, dtype=float), distribution),
+                         (groups,))
+    uc = np.sqrt(ua**2 + ub**2)
+    dof_eff = welch_satterthwaite(uc, ua, counts - 1, ub, type_b_dof)
+    if confidence_level is not None:
+        k = coverage_factor(dof_eff, confidence_level)
+    else:
+        k = np.broadcast_to(np.asarray(confidence_factor, dtype=float), (groups,))
+    dof_eff = np.where(counts < 2, np.nan, dof_eff)
+    k = np.where(counts < 2, np.nan, k)
+
+    return {
+        "sets": labels,
+        "n": counts,
+        "mean": mean,
+        "std_dev": std_dev,
+        "ua": ua,
+        "ub": ub,
+        "uc": uc,
+        "dof_eff": dof_eff,
+        "confidence_factor": k,
+        "ue": k * uc,
+    }
+
+
+def grouped_linear_fit(x_values, y_values, series, slope_test=True):
+    """
+    按系列分组做线性拟合：所有系列的斜率、截距及其不确定度用分段归约（bincount）一次算出
+
+    返回字典，各参数为按系列标签排序的数组；X值全相同的系列参数为nan，n<3的系列不确定度为nan。
+    slope_equality 为各系列斜率相等的F检验结果（组数不足、自由度不足或slope_test为False时为None）。
+    """
+    x_array = np.asarray(x_values, dtype=float)
+    y_array = np.asarray(y_values, dtype=float)
+    labels, inverse = np.unique(np.asarray(series), return_inverse=True)
+    inverse = inverse.ravel()
+    groups = len(labels)
+
+    counts = np.bincount(inverse, minlength=groups)
+    x_mean = np.bincount(inverse, x_array, groups) / counts
+    y_mean = np.bincount(inverse, y_array, groups) / counts
+
+    # 组内中心化后归约，避免大数相减损失精度
+    dx = x_array - x_mean[inverse]
+    dy = y_array - y_mean[inverse]
+    sxx = np.bincount(inverse, dx * dx, groups)
+    syy = np.bincount(inverse, dy * dy, groups)
+    sxy = np.bincount(inverse, dx * dy, groups)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        slope = np.where(sxx > 0, sxy / sxx, np.nan)
+        intercept = y_mean - slope * x_mean
+        rss = np.maximum(syy - slope * sxy, 0.0)
+        residual_std = np.where(counts > 2, np.sqrt(rss / (counts - 2)), np.nan)
+        slope_uncertainty = residual_std * np.sqrt(1.0 / sxx)
+        intercept_uncertainty = residual_std * np.sqrt((sxx + counts * x_mean**2) / (counts * sxx))
+        r_squared = np.where(sxx > 0, np.where(syy > 0, sxy**2 / (sxx * syy), 1.0), np.nan)
+
+    return {
+        "series": labels,
+        "n": counts,
+        "slope": slope,
+        "intercept": intercept,
+        "slope_uncertainty": slope_uncertainty,
+        "intercept_uncertainty": intercept_uncertainty,
+        "r_squared": r_squared,
+        "residual_std": residual_std,
+        "slope_equality": slope_equality_test(sxx, syy, sxy, counts) if slope_test else None,
+    }
+
+
+def slope_equality_test(sxx, syy, sxy, counts):
+    """
+    各系列斜率相等的F检验（协方差分析的平行性检验）
+
+    比较"各系列共用斜率、截距各异"与"各系列斜率、截距均各异"两个模型的残差平方和：
+    F = [(RSS_共用 - RSS_各异) / (g-1)] / [RSS_各异 / (N-2g)]
+    """
+    valid = (counts > 2) & (sxx > 0)
+    groups = int(np.count_nonzero(valid))
+    total = int(np.sum(counts[valid]))
+    df1 = groups - 1
+    df2 = total - 2 * groups
+    if df1 < 1 or df2 < 1:
+        return None
+
+    sxx, syy, sxy = sxx[valid], syy[valid], sxy[valid]
+    common_slope = np.sum(sxy) / np.sum(sxx)
+    rss_separate = np.sum(np.maximum(syy - sxy**2 / sxx, 0.0))
+    rss_common = np.sum(syy) - common_slope**2 * np.sum(sxx)
+    if rss_separate > 0:
+        f_value = (rss_common - rss_separate) / df1 / (rss_separate / df2)
+    else:
+        f_value = np.inf if rss_common > rss_separate else 0.0
+
+    from scipy import stats  # 仅在检验时导入
+    return {
+        "common_slope": float(common_slope),
+        "f_value": float(f_value),
+        "df": (df1, df2),
+        "p_value": float(stats.f.sf(f_value, df1, df2)),
+    }
@@ -0,0 +1,494 @@
+"""
+图表与报告后台导出工具
+
+本模块用于：
+1. 对界面中的matplotlib图形做快照，在后台进程中渲染为PNG/SVG/PDF，不阻塞界面
+2. 导出矢量格式时对大数据量曲线和散点做抽稀，保持外观的同时减小文件体积
+3. 为大量数据集并行生成PDF/HTML报告（拟合结果或不确定度结果）
+
+命令行批量导出报告:
+    python figure_export.py 输出目录 数据1.csv 数据2.csv ... [--precision 0.01] [--level 0.9545]
+两列数据按(x,y)做线性拟合（第三列为系列时按系列分组拟合），单列数据计算不确定度。
+不确定度数据集默认由有效自由度查t分布表得到95.45%置信水平的包含因子k（--k 指定固定k），
+多个不确定度数据集用data_analysis.batch_uncertainty一次算出。
+
+作者: Cascade
+日期: 2025-03-26
+"""
+
+import os
+import io
+import sys
+import html
+import pickle
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from data_analysis import linear_fit, grouped_linear_fit, calculate_uncertainty, batch_uncertainty
+
+# 支持的导出格式
+EXPORT_FORMATS = ("png", "svg", "pdf")
+VECTOR_FORMATS = ("svg", "pdf")
+REPORT_FORMATS = ("pdf", "html")
+
+# 矢量图中单条曲线/单组散点保留的最大点数
+DEFAULT_MAX_POINTS = 5000
+
+# 多系列叠加绘图时，每个系列在屏幕上显示的最大散点数
+SERIES_MAX_POINTS = 2000
+
+
+def snapshot_figure(fig):
+    """对图形做快照（序列化），之后界面上的修改不影响导出结果"""
+    return pickle.dumps(fig, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def decimate_line(x, y, max_points):
+    """按min-max分桶抽稀曲线，保留每个桶内的极值以维持曲线包络"""
+    x = np.asarray(x)
+    y = np.asarray(y, dtype=float)
+    n = len(y)
+    if n <= max_points or max_points < 4:
+        return x, y
+
+    buckets = max_points // 2
+    size = -(-n // buckets)  # 向上取整
+    padded = np.pad(y, (0, buckets * size - n), mode="edge").reshape(buckets, size)
+    base = np.arange(buckets) * size
+    idx = np.concatenate([
+        base + np.argmin(padded, axis=1),
+        base + np.argmax(padded, axis=1),
+        [0, n - 1],
+    ])
+    idx = np.unique(np.minimum(idx, n - 1))
+    return x[idx], y[idx]
+
+
+def decimate_points(offsets, max_points, grid=1024):
+    """按屏幕网格抽稀散点：每个网格单元只保留一个点，返回保留点的索引"""
+    offsets = np.asarray(offsets, dtype=float)
+    n = len(offsets)
+    if n <= max_points:
+        return np.arange(n)
+
+    lo = np.nanmin(offsets, axis=0)
+    span = np.nanmax(offsets, axis=0) - lo
+    span[span == 0] = 1.0
+    cells = np.nan_to_num((offsets - lo) / span * (grid - 1)).astype(np.int64)
+    keys = cells[:, 0] * grid + cells[:, 1]
+    _, keep = np.unique(keys, return_index=True)
+    keep.sort()
+    if len(keep) > max_points:
+        keep = keep[np.linspace(0, len(keep) - 1, max_points).astype(int)]
+    return keep
+
+
+def decimate_figure(fig, max_points=DEFAULT_MAX_POINTS):
+    """对图形中所有曲线和散点做原地抽稀"""
+    for ax in fig.axes:
+        for line in ax.get_lines():
+            x, y = line.get_data()
+            if len(y) > max_points:
+                line.set_data(*decimate_line(x, y, max_points))
+
+        for collection in ax.collections:
+            offsets = collection.get_offsets()
+            if len(offsets) <= max_points:
+                continue
+            keep = decimate_points(offsets, max_points)
+            collection.set_offsets(np.asarray(offsets)[keep])
+            # 逐点设置的颜色/大小需同步裁剪
+            facecolors = collection.get_facecolors()
+            if len(facecolors) == len(offsets):
+                collection.set_facecolors(facecolors[keep])
+            sizes = collection.get_sizes()
+            if len(sizes) == len(offsets):
+                collection.set_sizes(sizes[keep])
+
+
+def _export_format(path, fmt=None):
+    """由参数或文件扩展名确定导出格式"""
+    fmt = (fmt or os.path.splitext(path)[1].lstrip(".") or "png").lower()
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"不支持的导出格式: {fmt}")
+    return fmt
+
+
+def render_snapshot(snapshot, path, fmt=None, dpi=300, max_points=DEFAULT_MAX_POINTS):
+    """在当前进程中渲染图形快照并保存，返回保存路径"""
+    fmt = _export_format(path, fmt)
+    fig = pickle.loads(snapshot)
+    if fmt in VECTOR_FORMATS and max_points:
+        decimate_figure(fig, max_points)
+    fig.savefig(path, format=fmt, dpi=dpi, bbox_inches="tight")
+    return path
+
+
+def _new_figure(figsize):
+    """创建不依赖GUI后端的图形"""
+    from matplotlib.figure import Figure
+    return Figure(figsize=figsize, dpi=100)
+
+
+def _plot_fit(ax, x_array, y_array, result):
+    """绘制散点、拟合直线和不确定度范围"""
+    slope = result["slope"]
+    intercept = result["intercept"]
+    slope_uncertainty = result["slope_uncertainty"]
+    intercept_uncertainty = result["intercept_uncertainty"]
+
+    ax.scatter(x_array, y_array, color='blue', marker='o', label='数据点')
+
+    x_min, x_max = np.min(x_array), np.max(x_array)
+    x_fit = np.linspace(x_min - 0.1 * (x_max - x_min), x_max + 0.1 * (x_max - x_min), 100)
+    ax.plot(x_fit, slope * x_fit + intercept, color='red', linewidth=2, label='拟合直线')
+
+    y_upper = (slope + slope_uncertainty) * x_fit + (intercept + intercept_uncertainty)
+    y_lower = (slope - slope_uncertainty) * x_fit + (intercept - intercept_uncertainty)
+    ax.fill_between(x_fit, y_lower, y_upper, color='green', alpha=0.2, label='不确定度范围')
+
+    ax.grid(True, linestyle='--', alpha=0.7)
+    ax.set_xlabel('X', fontsize=10)
+    ax.set_ylabel('Y', fontsize=10)
+    ax.set_title('最小二乘法拟合', fontsize=12)
+    ax.legend(fontsize=9)
+
+
+def format_series(label):
+    """系列标签的显示文字（数值标签去掉多余的小数位）"""
+    if isinstance(label, (float, np.floating)):
+        return f"{label:g}"
+    return str(label)
+
+
+def plot_series(ax, x_array, y_array, series, result=None, max_points=SERIES_MAX_POINTS):
+    """
+    多系列叠加绘图：每个系列只用一个（抽稀后的）散点对象，
+    给出grouped_linear_fit的结果时再为每个系列绘制一条拟合直线和不确定度范围
+    """
+    x_array = np.asarray(x_array, dtype=float)
+    y_array = np.asarray(y_array, dtype=float)
+    labels, inverse = np.unique(np.asarray(series), return_inverse=True)
+    inverse = inverse.ravel()
+
+    # 按系列排序一次，之后每个系列都是连续切片
+    order = np.argsort(inverse, kind="stable")
+    bounds = np.searchsorted(inverse[order], np.arange(len(labels) + 1))
+    if result is not None:
+        x_min, x_max = np.min(x_array), np.max(x_array)
+        x_fit = np.linspace(x_min - 0.1 * (x_max - x_min), x_max + 0.1 * (x_max - x_min), 100)
+
+    for i, label in enumerate(labels):
+        color = f"C{i % 10}"
+        idx = order[bounds[i]:bounds[i + 1]]
+        points = np.column_stack([x_array[idx], y_array[idx]])
+        points = points[decimate_points(points, max_points)]
+        ax.scatter(points[:, 0], points[:, 1], color=color, marker='o', s=16,
+                   label=f'系列 {format_series(label)}')
+
+        if result is None or not np.isfinite(result["slope"][i]):
+            continue
+        slope = result["slope"][i]
+        intercept = result["intercept"][i]
+        ax.plot(x_fit, slope * x_fit + intercept, color=color, linewidth=2)
+        slope_uncertainty = result["slope_uncertainty"][i]
+        intercept_uncertainty = result["intercept_uncertainty"][i]
+        if np.isfinite(slope_uncertainty):
+            y_upper = (slope + slope_uncertainty) * x_fit + (intercept + intercept_uncertainty)
+            y_lower = (slope - slope_uncertainty) * x_fit + (intercept - intercept_uncertainty)
+            ax.fill_between(x_fit, y_lower, y_upper, color=color, alpha=0.15)
+
+    ax.grid(True, linestyle='--', alpha=0.7)
+    ax.set_xlabel('X', fontsize=10)
+    ax.set_ylabel('Y', fontsize=10)
+    ax.set_title('最小二乘法拟合', fontsize=12)
+    ax.legend(fontsize=9)
+
+
+def series_result_lines(result):
+    """生成多系列拟合的结果文字"""
+    lines = []
+    for i, label in enumerate(result["series"]):
+        lines.append(
+            f"系列 {format_series(label)} (n={result['n'][i]}): "
+            f"a = {result['slope'][i]:.6f} ± {result['slope_uncertainty'][i]:.6f}, "
+            f"b = {result['intercept'][i]:.6f} ± {result['intercept_uncertainty'][i]:.6f}, "
+            f"R² = {result['r_squared'][i]:.6f}"
+        )
+    test = result["slope_equality"]
+    if test is not None:
+        lines.append(
+            f"斜率相等检验: F({test['df'][0]}, {test['df'][1]}) = {test['f_value']:.4f}, "
+            f"p = {test['p_value']:.4g}, 共同斜率 = {test['common_slope']:.6f}"
+        )
+    return lines
+
+
+def _plot_distribution(ax, data_array, result):
+    """绘制数据分布直方图、均值线和扩展不确定度范围"""
+    mean_value = result["mean"]
+    ue = result["ue"]
+
+    ax.hist(data_array, bins='auto', alpha=0.7, color='skyblue', edgecolor='black')
+    ax.axvline(mean_value, color='red', linestyle='--', linewidth=2, label=f'均值: {mean_value:.4f}')
+    ax.axvline(mean_value - ue, color='green', linestyle=':', linewidth=2,
+               label=f'扩展不确定度范围: ±{ue:.4f}')
+    ax.axvline(mean_value + ue, color='green', linestyle=':', linewidth=2)
+
+    ax.set_xlabel('数据值')
+    ax.set_ylabel('频数')
+    ax.set_title('数据分布与不确定度', fontsize=12)
+    ax.grid(True, linestyle='--', alpha=0.7)
+    ax.legend()
+
+
+def _result_lines(kind, result):
+    """生成报告中的结果文字"""
+    if kind == "series":
+        return series_result_lines(result)
+    if kind == "fit":
+        return [
+            f"拟合方程: Y = ({result['slope']:.6f} ± {result['slope_uncertainty']:.6f})X"
+            f" + ({result['intercept']:.6f} ± {result['intercept_uncertainty']:.6f})",
+            f"斜率(a): {result['slope']:.6f} ± {result['slope_uncertainty']:.6f}",
+            f"截距(b): {result['intercept']:.6f} ± {result['intercept_uncertainty']:.6f}",
+            f"相关系数(R²): {result['r_squared']:.6f}",
+            f"残差标准差(σ): {result['residual_std']:.6f}",
+            f"数据点数: {result['n']}",
+        ]
+    return [
+        f"数据均值: {result['mean']:.6f}",
+        f"样本标准差: {result['std_dev']:.6f}",
+        f"样本数量: {result['n']}",
+        f"A类不确定度 (u_A): {result['ua']:.6f}",
+        f"B类不确定度 (u_B): {result['ub']:.6f} ({result['distribution']})",
+        f"合成不确定度 (u_c): {result['uc']:.6f}",
+        f"有效自由度 (ν_eff): {result['dof_eff']:.2f}",
+        f"扩展不确定度 (U=k×u_c): {result['ue']:.6f} (k={result['confidence_factor']:.4f})",
+        f"最终测量结果: X = ({result['mean']:.6f} ± {result['ue']:.6f})",
+    ]
+
+
+def render_report(dataset, output_dir, formats=REPORT_FORMATS, max_points=DEFAULT_MAX_POINTS):
+    """
+    为单个数据集生成报告，返回生成的文件路径列表
+
+    dataset为字典：
+    - name: 数据集名称（用作文件名）
+    - kind: "fit"（需提供x、y，可选series按系列分组拟合）或 "uncertainty"
+      （需提供values，可选instrument_precision、distribution、confidence_factor，
+      或给出confidence_level及type_b_dof由有效自由度自动计算k；
+      已给出result时直接使用，见batch_uncertainty_results）
+    """
+    name = dataset["name"]
+    kind = dataset.get("kind", "fit")
+
+    fig = _new_figure((7, 8))
+    ax = fig.add_axes([0.12, 0.42, 0.82, 0.52])
+    if kind == "fit":
+        x_array = np.asarray(dataset["x"], dtype=float)
+        y_array = np.asarray(dataset["y"], dtype=float)
+        series = dataset.get("series")
+        if series is not None and len(np.unique(series)) > 1:
+            kind = "series"
+            result = grouped_linear_fit(x_array, y_array, series)
+            plot_series(ax, x_array, y_array, series, result)
+        else:
+            result = linear_fit(x_array, y_array)
+            _plot_fit(ax, x_array, y_array, result)
+    elif kind == "uncertainty":
+        data_array = np.asarray(dataset["values"], dtype=float)
+        result = dataset.get("result") or calculate_uncertainty(
+            data_array,
+            dataset.get("instrument_precision", 0.0),
+            dataset.get("distribution", "均匀分布"),
+            dataset.get("confidence_factor", 2.0),
+            dataset.get("confidence_level"),
+            dataset.get("type_b_dof", np.inf),
+        )
+        _plot_distribution(ax, data_array, result)
+    else:
+        raise ValueError(f"未知的数据集类型: {kind}")
+
+    lines = _result_lines(kind, result)
+    if max_points:
+        decimate_figure(fig, max_points)
+
+    os.makedirs(output_dir, exist_ok=True)
+    paths = []
+    for fmt in formats:
+        path = os.path.join(output_dir, f"{name}.{fmt}")
+        if fmt == "pdf":
+            texts = [
+                fig.text(0.08, 0.34, name, fontsize=12, weight="bold", va="top"),
+                fig.text(0.08, 0.30, "\n".join(lines), fontsize=10, va="top", linespacing=1.6),
+            ]
+            fig.savefig(path, format="pdf")
+            # 移除文字，避免影响后续HTML中的内嵌图
+            for text in texts:
+                text.remove()
+        elif fmt == "html":
+            buffer = io.StringIO()
+            fig.savefig(buffer, format="svg", bbox_inches="tight")
+            svg = buffer.getvalue()
+            svg = svg[svg.find("<svg"):]  # 去掉XML声明，便于内嵌
+            items = "\n".join(f"<li>{html.escape(line)}</li>" for line in lines)
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(
+                    "<!DOCTYPE html>\n<html><head><meta charset=\"utf-8\">"
+                    f"<title>{html.escape(name)}</title></head><body>\n"
+                    f"<h2>{html.escape(name)}</h2>\n{svg}\n<ul>\n{items}\n</ul>\n"
+                    "</body></html>\n"
+                )
+        else:
+            raise ValueError(f"不支持的报告格式: {fmt}")
+        paths.append(path)
+    return paths
+
+
+class FigureExporter:
+    """后台导出器：在进程池中渲染图形快照和报告，提交后立即返回Future"""
+
+    def __init__(self, max_workers=None):
+        self.max_workers = max_workers
+        self._executor = None
+
+    @property
+    def executor(self):
+        # 首次使用时再创建进程池，不增加程序启动时间
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+        return self._executor
+
+    def export(self, fig, path, fmt=None, dpi=300, max_points=DEFAULT_MAX_POINTS):
+        """快照图形并提交后台渲染"""
+        fmt = _export_format(path, fmt)
+        snapshot = snapshot_figure(fig)
+        return self.executor.submit(render_snapshot, snapshot, path, fmt, dpi, max_points)
+
+    def export_reports(self, datasets, output_dir, formats=REPORT_FORMATS,
+                       max_points=DEFAULT_MAX_POINTS):
+        """为每个数据集提交一个报告渲染任务，返回Future列表"""
+        return [
+            self.executor.submit(render_report, dataset, output_dir, formats, max_points)
+            for dataset in datasets
+        ]
+
+    def shutdown(self, wait=True):
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait, cancel_futures=not wait)
+            self._executor = None
+
+
+def export_reports(datasets, output_dir, formats=REPORT_FORMATS, max_workers=None,
+                   max_points=DEFAULT_MAX_POINTS):
+    """并行批量生成报告并等待完成，返回 (成功的文件路径列表, 失败的(名称, 错误)列表)"""
+    exporter = FigureExporter(max_workers)
+    paths, errors = [], []
+    try:
+        futures = exporter.export_reports(datasets, output_dir, formats, max_points)
+        names = {future: dataset["name"] for future, dataset in zip(futures, datasets)}
+        for future in as_completed(futures):
+            try:
+                paths.extend(future.result())
+            except Exception as e:
+                errors.append((names[future], str(e)))
+    finally:
+        exporter.shutdown()
+    return paths, errors
+
+
+def batch_uncertainty_results(datasets):
+    """
+    用batch_uncertainty一次算出所有不确定度数据集的结果，返回附带result的数据集列表
+
+    分布和置信水平相同的数据集合为一批，仪器精度、k和B类自由度按数据集传入；
+    数据点少于2个的数据集不预先计算，由render_report报错。
+    """
+    batches = {}
+    for i, dataset in enumerate(datasets):
+        if dataset.get("kind", "fit") == "uncertainty" and "result" not in dataset \
+                and len(dataset["values"]) >= 2:
+            key = (dataset.get("distribution", "均匀分布"), dataset.get("confidence_level"))
+            batches.setdefault(key, []).append(i)
+
+    datasets = list(datasets)
+    for (distribution, confidence_level), indices in batches.items():
+        members = [datasets[i] for i in indices]
+        values = [np.asarray(dataset["values"], dtype=float) for dataset in members]
+        result = batch_uncertainty(
+            np.concatenate(values),
+            np.repeat(np.arange(len(members)), [len(array) for array in values]),
+            np.array([dataset.get("instrument_precision", 0.0) for dataset in members], dtype=float),
+            distribution,
+            confidence_level,
+            np.array([dataset.get("type_b_dof", np.inf) for dataset in members], dtype=float),
+            np.array([dataset.get("confidence_factor", 2.0) for dataset in members], dtype=float),
+        )
+        for j, i in enumerate(indices):
+            item = {key: float(result[key][j]) for key in
+                    ("mean", "std_dev", "ua", "ub", "uc", "ue", "confidence_factor", "dof_eff")}
+            item.update(n=int(result["n"][j]), distribution=distribution, confidence_level=confidence_level)
+            datasets[i] = dict(datasets[i], result=item)
+    return datasets
+
+
+def load_dataset(path):
+    """从CSV/文本文件读取数据集：两列为拟合数据（第三列为系列），单列为不确定度数据；首行可为表头"""
+    try:
+        data = np.loadtxt(path, delimiter=",", ndmin=2, comments="#")
+    except ValueError:
+        # 首行可能是表头，跳过第一行再解析
+        data = np.loadtxt(path, delimiter=",", ndmin=2, comments="#", skiprows=1)
+    name = os.path.splitext(os.path.basename(path))[0]
+    if data.shape[1] >= 3:
+        return {"name": name, "kind": "fit", "x": data[:, 0], "y": data[:, 1], "series": data[:, 2]}
+    if data.shape[1] == 2:
+        return {"name": name, "kind": "fit", "x": data[:, 0], "y": data[:, 1]}
+    return {"name": name, "kind": "uncertainty", "values": data[:, 0]}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="并行批量导出拟合/不确定度报告")
+    parser.add_argument("output_dir", help="报告输出目录")
+    parser.add_argument("files", nargs="+", help="数据文件（逗号分隔）")
+    parser.add_argument("--formats", default="pdf,html", help="报告格式，逗号分隔（pdf,html）")
+    parser.add_argument("--workers", type=int, default=None, help="并行进程数")
+    parser.add_argument("--precision", type=float, default=0.0, help="不确定度数据的仪器精度")
+    parser.add_argument("--distribution", default="均匀分布", help="B类不确定度分布")
+    parser.add_argument("--level", type=float, default=0.9545,
+                        help="置信水平，k由有效自由度计算（默认0.9545）")
+    parser.add_argument("--k", type=float, default=None, help="固定置信系数k（给出时忽略--level）")
+    parser.add_argument("--type-b-dof", type=float, default=np.inf, help="B类不确定度自由度（默认∞）")
+    args = parser.parse_args(argv)
+
+    formats = tuple(fmt.strip().lower() for fmt in args.formats.split(",") if fmt.strip())
+    settings = {"instrument_precision": args.precision, "distribution": args.distribution,
+                "confidence_factor": args.k if args.k is not None else 2.0,
+                "confidence_level": None if args.k is not None else args.level,
+                "type_b_dof": args.type_b_dof}
+
+    # 单个文件读取失败只记录错误，不影响其他数据集的报告
+    datasets, errors = [], []
+    for path in args.files:
+        try:
+            dataset = load_dataset(path)
+        except (OSError, ValueError) as e:
+            errors.append((path, f"读取失败: {e}"))
+            continue
+        if dataset["kind"] == "uncertainty":
+            dataset = dict(dataset, **settings)
+        datasets.append(dataset)
+    datasets = batch_uncertainty_results(datasets)
+    paths, export_errors = export_reports(datasets, args.output_dir, formats, args.workers)
+    errors.extend((name, f"导出失败: {error}") for name, error in export_errors)
+    print(f"已生成 {len(paths)} 个报告文件")
+    for name, error in errors:
+        print(f"{name}: {error}", file=sys.stderr)
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
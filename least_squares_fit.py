@@ -5,18 +5,48 @@
 1. 对一组(x,y)数据进行线性最小二乘法拟合
 2. 计算拟合参数（斜率和截距）及其不确定度
 3. 可视化拟合结果和不确定度范围
+4. 在后台进程中导出图表（PNG/SVG/PDF）和拟合报告（PDF/HTML）
+5. 自动保存会话数据，重新打开程序时恢复
+6. 按系列（如不同温度、样品）分组拟合，叠加绘图并检验各系列斜率是否相等
+7. 对超出内存的长时间记录数据文件做分块流式拟合
+
+设置环境变量 LAB_COMPUTE_SERVER 后，拟合计算交给本地计算服务（compute_server.py）完成。
 
 作者: Cascade
 日期: 2025-03-26
 """
 
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 import tkinter as tk
-from tkinter import ttk, messagebox, scrolledtext
+from tkinter import ttk, messagebox, scrolledtext, filedialog
 import matplotlib.pyplot as plt
 from matplotlib.figure import Figure
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg, NavigationToolbar2Tk
-from scipy import stats
+
+from compute_client import ComputeClient, ServiceError
+from data_analysis import linear_fit, grouped_linear_fit
+from figure_export import (FigureExporter, plot_series, series_result_lines, format_series,
+                           decimate_points, SERIES_MAX_POINTS)
+from session_store import SessionStore
+from streaming_stats import stream_fit
+
+# 会话数据目录（每次添加/删除数据即自动保存）
+SESSION_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'least_squares_fit.session')
+
+# 默认系列标签（旧会话数据也归入此系列）
+DEFAULT_SERIES = 1.0
+
+# 计算服务请求超时（秒）
+SERVICE_TIMEOUT = 5
+
+# 检查会话日志是否需要合并的间隔（毫秒）
+COMPACT_INTERVAL_MS = 5000
+
+# 表格中显示的最大行数（只显示最近的数据，全部数据仍参与拟合和绘图）
+TREE_MAX_ROWS = 1000
 
 class LeastSquaresFitApp:
     def __init__(self, root):
@@ -30,10 +60,11 @@ class LeastSquaresFitApp:
         self.style.configure("TButton", font=("微软雅黑", 10))
         self.style.configure("TLabel", font=("微软雅黑", 10))
         
-        # 数据存储
-        self.x_values = []
-        self.y_values = []
-        self.data_ids = []
+        # 数据存储（numpy数组，会话数据为内存映射）
+        self.x_values = np.empty(0)
+        self.y_values = np.empty(0)
+        self.series_values = np.empty(0)
+        self.data_ids = np.empty(0, dtype=np.int64)
         self.next_id = 1
         
         # 拟合结果
@@ -44,9 +75,32 @@ class LeastSquaresFitApp:
         self.r_squared = None  # 相关系数R²
         self.residual_std = None  # 残差标准差
         
+        # 后台导出器（首次导出时才启动进程池）
+        self.exporter = FigureExporter()
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+        
+        # 计算服务客户端（未配置时为None，在本地计算）；请求在单独的后台线程中发送，
+        # 超时后退回本地计算
+        self.compute_client = ComputeClient.from_env(timeout=SERVICE_TIMEOUT)
+        self.compute_executor = ThreadPoolExecutor(max_workers=1)
+        
+        # 大文件流式拟合在后台线程中进行；关闭窗口时设置取消标志，计算在当前块完成后停止
+        self.stream_executor = ThreadPoolExecutor(max_workers=1)
+        self.stream_cancel = threading.Event()
+        
+        # 会话存储（日志由定时任务在后台线程中合并，不在添加数据时重写整个数据集）
+        self.session = SessionStore(SESSION_PATH, columns=("x", "y", "series"), fill_value=DEFAULT_SERIES,
+                                    auto_compact=False)
+        
         # 创建界面
         self.create_widgets()
         
+        # 恢复上次的数据
+        self.load_session()
+        
+        # 定期检查是否需要合并会话日志
+        self.root.after(COMPACT_INTERVAL_MS, self.schedule_compaction)
+        
     def create_widgets(self):
         # 创建主框架
         main_frame = ttk.Frame(self.root, padding="10")
@@ -72,6 +126,15 @@ class LeastSquaresFitApp:
         self.y_entry = ttk.Entry(y_frame)
         self.y_entry.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=5)
         
+        # 系列输入（同一条件下的测量归为一个系列，如温度、样品编号）
+        series_frame = ttk.Frame(input_frame)
+        series_frame.pack(fill=tk.X, pady=5)
+        
+        ttk.Label(series_frame, text="系列:").pack(side=tk.LEFT)
+        self.series_entry = ttk.Entry(series_frame)
+        self.series_entry.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=5)
+        self.series_entry.insert(0, format_series(DEFAULT_SERIES))
+        
         # 添加按钮
         button_frame = ttk.Frame(input_frame)
         button_frame.pack(fill=tk.X, pady=10)
@@ -80,16 +143,19 @@ class LeastSquaresFitApp:
         ttk.Button(button_frame, text="删除选中", command=self.delete_selected_data).pack(side=tk.LEFT, padx=5)
         ttk.Button(button_frame, text="清除所有", command=self.clear_data).pack(side=tk.LEFT, padx=5)
         ttk.Button(button_frame, text="拟合数据", command=self.fit_data).pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="大文件拟合", command=self.fit_file).pack(side=tk.LEFT, padx=5)
         ttk.Button(button_frame, text="保存图表", command=self.save_plot).pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="导出报告", command=self.export_report).pack(side=tk.LEFT, padx=5)
         
         # 数据显示区域
         data_display_frame = ttk.Frame(input_frame)
         data_display_frame.pack(fill=tk.BOTH, expand=True, pady=10)
         
-        ttk.Label(data_display_frame, text="已输入的数据:").pack(anchor=tk.W)
+        self.count_label = ttk.Label(data_display_frame, text="已输入的数据:")
+        self.count_label.pack(anchor=tk.W)
         
         # 创建表格
-        columns = ("ID", "X值", "Y值")
+        columns = ("ID", "系列", "X值", "Y值")
         self.data_tree = ttk.Treeview(data_display_frame, columns=columns, show="headings", height=15, selectmode="extended")
         
         # 设置列标题
@@ -180,25 +246,70 @@ class LeastSquaresFitApp:
         finally:
             self.context_menu.grab_release()
     
+    def schedule_compaction(self):
+        """日志过长时在后台线程中合并会话，之后继续定期检查"""
+        self.session.compact_in_background()
+        self.root.after(COMPACT_INTERVAL_MS, self.schedule_compaction)
+    
+    def load_session(self):
+        """从会话存储恢复数据（直接使用内存映射数组，不转换为Python列表）"""
+        ids, columns, self.next_id = self.session.load()
+        self.data_ids = ids
+        self.x_values = columns["x"]
+        self.y_values = columns["y"]
+        self.series_values = columns["series"]
+        
+        self.refresh_tree()
+        if len(self.data_ids):
+            self.update_scatter_plot()
+    
+    def refresh_tree(self):
+        """重建表格，只显示最近TREE_MAX_ROWS条数据"""
+        self.data_tree.delete(*self.data_tree.get_children())
+        start = max(0, len(self.data_ids) - TREE_MAX_ROWS)
+        for data_id, series, x_value, y_value in zip(self.data_ids[start:].tolist(),
+                                                     self.series_values[start:].tolist(),
+                                                     self.x_values[start:].tolist(),
+                                                     self.y_values[start:].tolist()):
+            self.data_tree.insert("", tk.END, values=(data_id, format_series(series), x_value, y_value))
+        self.update_count_label()
+    
+    def update_count_label(self):
+        """更新表格上方的数据计数"""
+        count = len(self.data_ids)
+        if count > TREE_MAX_ROWS:
+            self.count_label.config(text=f"已输入的数据（共{count}个，表格显示最近{TREE_MAX_ROWS}个）:")
+        else:
+            self.count_label.config(text="已输入的数据:")
+    
     def add_data(self):
         """添加数据到列表"""
         try:
             x_value = float(self.x_entry.get())
             y_value = float(self.y_entry.get())
+            series = float(self.series_entry.get())
             
-            # 添加到数据列表
-            self.x_values.append(x_value)
-            self.y_values.append(y_value)
+            # 添加到数据数组
+            self.x_values = np.append(self.x_values, x_value)
+            self.y_values = np.append(self.y_values, y_value)
+            self.series_values = np.append(self.series_values, series)
             
             # 记录数据ID
             data_id = self.next_id
-            self.data_ids.append(data_id)
+            self.data_ids = np.append(self.data_ids, data_id)
             self.next_id += 1
             
-            # 更新表格
-            self.data_tree.insert("", tk.END, values=(data_id, x_value, y_value))
+            # 写入会话日志
+            self.session.append(data_id, (x_value, y_value, series))
+            
+            # 更新表格（超出显示行数时移除最早的一行）
+            self.data_tree.insert("", tk.END, values=(data_id, format_series(series), x_value, y_value))
+            items = self.data_tree.get_children()
+            if len(items) > TREE_MAX_ROWS:
+                self.data_tree.delete(items[0])
+            self.update_count_label()
             
-            # 清空输入框
+            # 清空输入框（保留系列，便于连续录入同一系列）
             self.x_entry.delete(0, tk.END)
             self.y_entry.delete(0, tk.END)
             self.x_entry.focus()
@@ -218,23 +329,21 @@ class LeastSquaresFitApp:
         
         # 确认删除
         if messagebox.askyesno("确认删除", f"确定要删除选中的 {len(selected_items)} 项数据吗？"):
-            for item in selected_items:
-                # 获取数据ID
-                data_id = int(self.data_tree.item(item, "values")[0])
-                
-                # 查找数据在列表中的索引
-                try:
-                    idx = self.data_ids.index(data_id)
-                    
-                    # 从数据列表中删除
-                    del self.x_values[idx]
-                    del self.y_values[idx]
-                    del self.data_ids[idx]
-                    
-                    # 从表格中删除
-                    self.data_tree.delete(item)
-                except ValueError:
-                    continue
+            # 获取数据ID
+            deleted_ids = [int(self.data_tree.item(item, "values")[0]) for item in selected_items]
+            
+            # 从数据数组中删除
+            keep = ~np.isin(self.data_ids, deleted_ids)
+            self.x_values = self.x_values[keep]
+            self.y_values = self.y_values[keep]
+            self.series_values = self.series_values[keep]
+            self.data_ids = self.data_ids[keep]
+            
+            # 写入会话日志
+            self.session.delete(deleted_ids)
+            
+            # 更新表格（补上被删除行之前的数据）
+            self.refresh_tree()
             
             # 更新散点图
             self.update_scatter_plot()
@@ -255,14 +364,15 @@ class LeastSquaresFitApp:
         # 确认清除
         if messagebox.askyesno("确认清除", "确定要清除所有数据吗？"):
             # 清空数据
-            self.x_values = []
-            self.y_values = []
-            self.data_ids = []
+            self.x_values = np.empty(0)
+            self.y_values = np.empty(0)
+            self.series_values = np.empty(0)
+            self.data_ids = np.empty(0, dtype=np.int64)
             self.next_id = 1
+            self.session.clear()
             
             # 清空表格
-            for item in self.data_tree.get_children():
-                self.data_tree.delete(item)
+            self.refresh_tree()
             
             # 清空图表
             self.ax.clear()
@@ -283,14 +393,21 @@ class LeastSquaresFitApp:
             self.r_squared = None
             self.residual_std = None
     
+    def has_multiple_series(self):
+        """数据是否包含多个系列"""
+        return len(self.series_values) > 0 and bool(np.any(self.series_values != self.series_values[0]))
+    
     def update_scatter_plot(self):
         """更新散点图"""
         # 清除旧图
         self.ax.clear()
         
-        if self.x_values and self.y_values:
+        if self.has_multiple_series():
+            # 每个系列一个抽稀后的散点对象
+            plot_series(self.ax, self.x_values, self.y_values, self.series_values)
+        elif len(self.x_values):
             # 绘制散点图
-            self.ax.scatter(self.x_values, self.y_values, color='blue', marker='o')
+            self.scatter(self.x_values, self.y_values)
         
         # 设置图表属性
         self.ax.grid(True, linestyle='--', alpha=0.7)
@@ -301,67 +418,144 @@ class LeastSquaresFitApp:
         # 更新画布
         self.canvas.draw()
     
+    def scatter(self, x_array, y_array, **kwargs):
+        """绘制散点（数据量大时按屏幕网格抽稀后显示）"""
+        keep = decimate_points(np.column_stack([x_array, y_array]), SERIES_MAX_POINTS)
+        self.ax.scatter(np.asarray(x_array)[keep], np.asarray(y_array)[keep], color='blue', marker='o', **kwargs)
+    
     def fit_data(self):
         """使用最小二乘法拟合数据"""
         if len(self.x_values) < 2:
             messagebox.showwarning("数据不足", "至少需要2个数据点才能进行拟合")
             return
         
+        # 转换为numpy数组（多个系列时按系列分组拟合）
+        x_array = np.asarray(self.x_values)
+        y_array = np.asarray(self.y_values)
+        series_array = np.asarray(self.series_values) if self.has_multiple_series() else None
+        
+        # 使用计算服务时在后台线程中请求，服务无响应也不阻塞界面
+        if self.compute_client is not None:
+            future = self.compute_executor.submit(self.compute_client.fit, x_array, y_array, series_array)
+            self.result_text.delete(1.0, tk.END)
+            self.result_text.insert(tk.END, "正在计算...\n")
+            self.root.after(50, self.poll_fit, future, x_array, y_array, series_array)
+            return
+        
         try:
-            # 转换为numpy数组
-            x_array = np.array(self.x_values)
-            y_array = np.array(self.y_values)
-            n = len(x_array)
-            
-            # 使用scipy.stats进行线性回归
-            slope, intercept, r_value, p_value, std_err = stats.linregress(x_array, y_array)
-            
-            # 计算拟合值
-            y_fit = slope * x_array + intercept
-            
-            # 计算残差
-            residuals = y_array - y_fit
-            
-            # 计算残差平方和
-            residual_sum_squares = np.sum(residuals**2)
-            
-            # 计算残差标准差
-            residual_std = np.sqrt(residual_sum_squares / (n - 2))
-            
-            # 计算斜率的不确定度
-            sum_x = np.sum(x_array)
-            sum_x_squared = np.sum(x_array**2)
-            denominator = n * sum_x_squared - sum_x**2
-            
-            slope_uncertainty = residual_std * np.sqrt(n / denominator)
-            
-            # 计算截距的不确定度
-            intercept_uncertainty = residual_std * np.sqrt(sum_x_squared / denominator)
-            
-            # 计算R²
-            r_squared = r_value**2
-            
-            # 保存结果
-            self.slope = slope
-            self.intercept = intercept
-            self.slope_uncertainty = slope_uncertainty
-            self.intercept_uncertainty = intercept_uncertainty
-            self.r_squared = r_squared
-            self.residual_std = residual_std
-            
-            # 显示结果
+            if series_array is not None:
+                result = grouped_linear_fit(x_array, y_array, series_array)
+            else:
+                result = linear_fit(x_array, y_array)
+        except Exception as e:
+            messagebox.showerror("计算错误", f"拟合过程中出现错误: {str(e)}")
+            return
+        self.show_fit(result, x_array, y_array, series_array)
+    
+    def poll_fit(self, future, x_array, y_array, series_array):
+        """轮询计算服务的拟合请求，完成后显示结果"""
+        if not future.done():
+            self.root.after(50, self.poll_fit, future, x_array, y_array, series_array)
+            return
+        
+        try:
+            result = future.result()
+        except ServiceError as e:
             self.result_text.delete(1.0, tk.END)
-            self.result_text.insert(tk.END, f"拟合方程: Y = ({slope:.6f} ± {slope_uncertainty:.6f})X + ({intercept:.6f} ± {intercept_uncertainty:.6f})\n\n")
-            self.result_text.insert(tk.END, f"斜率(a): {slope:.6f} ± {slope_uncertainty:.6f}\n")
-            self.result_text.insert(tk.END, f"截距(b): {intercept:.6f} ± {intercept_uncertainty:.6f}\n")
-            self.result_text.insert(tk.END, f"相关系数(R²): {r_squared:.6f}\n")
-            self.result_text.insert(tk.END, f"残差标准差(σ): {residual_std:.6f}\n")
-            
-            # 更新图表
-            self.update_fit_plot(x_array, y_array, slope, intercept, slope_uncertainty, intercept_uncertainty)
-            
+            messagebox.showerror("计算服务错误", f"计算服务拒绝了拟合请求: {str(e)}")
+            return
         except Exception as e:
+            self.result_text.delete(1.0, tk.END)
             messagebox.showerror("计算错误", f"拟合过程中出现错误: {str(e)}")
+            return
+        self.show_fit(result, x_array, y_array, series_array)
+    
+    def show_fit(self, result, x_array, y_array, series_array=None):
+        """保存拟合结果，显示并更新图表"""
+        if series_array is not None:
+            self.show_series_result(result, x_array, y_array, series_array)
+            return
+        
+        # 保存结果
+        self.slope = result["slope"]
+        self.intercept = result["intercept"]
+        self.slope_uncertainty = result["slope_uncertainty"]
+        self.intercept_uncertainty = result["intercept_uncertainty"]
+        self.r_squared = result["r_squared"]
+        self.residual_std = result["residual_std"]
+        
+        # 显示结果
+        self.show_fit_result(result)
+        
+        # 更新图表
+        self.update_fit_plot(x_array, y_array, self.slope, self.intercept,
+                             self.slope_uncertainty, self.intercept_uncertainty)
+    
+    def show_fit_result(self, result, source=None):
+        """在结果区域显示单条直线的拟合结果"""
+        slope = result["slope"]
+        intercept = result["intercept"]
+        slope_uncertainty = result["slope_uncertainty"]
+        intercept_uncertainty = result["intercept_uncertainty"]
+        
+        self.result_text.delete(1.0, tk.END)
+        if source:
+            self.result_text.insert(tk.END, f"数据文件: {source}（{result['n']}个数据点）\n")
+        self.result_text.insert(tk.END, f"拟合方程: Y = ({slope:.6f} ± {slope_uncertainty:.6f})X + ({intercept:.6f} ± {intercept_uncertainty:.6f})\n\n")
+        self.result_text.insert(tk.END, f"斜率(a): {slope:.6f} ± {slope_uncertainty:.6f}\n")
+        self.result_text.insert(tk.END, f"截距(b): {intercept:.6f} ± {intercept_uncertainty:.6f}\n")
+        self.result_text.insert(tk.END, f"相关系数(R²): {result['r_squared']:.6f}\n")
+        self.result_text.insert(tk.END, f"残差标准差(σ): {result['residual_std']:.6f}\n")
+    
+    def fit_file(self):
+        """对超出内存的数据文件（前两列为x、y）做分块流式拟合，在后台线程中进行，不阻塞界面"""
+        path = filedialog.askopenfilename(
+            title="选择数据文件",
+            filetypes=[("数据文件", "*.npy *.csv *.txt *.dat *.bin"), ("所有文件", "*.*")])
+        if not path:
+            return
+        
+        # 原始二进制文件按每行两个float64(x, y)读取
+        future = self.stream_executor.submit(stream_fit, path, (0, 1), raw_columns=2,
+                                             cancel_event=self.stream_cancel)
+        self.result_text.delete(1.0, tk.END)
+        self.result_text.insert(tk.END, f"正在分块拟合: {path}\n")
+        self.root.after(200, self.poll_fit_file, future, path)
+    
+    def poll_fit_file(self, future, path):
+        """轮询后台流式拟合，完成后显示结果（数据不载入会话，也不绘图）"""
+        if not future.done():
+            self.root.after(200, self.poll_fit_file, future, path)
+            return
+        
+        try:
+            result = future.result()
+        except Exception as e:
+            self.result_text.delete(1.0, tk.END)
+            messagebox.showerror("计算错误", f"文件拟合过程中出现错误: {str(e)}")
+            return
+        self.show_fit_result(result, source=path)
+    
+    def show_series_result(self, result, x_array, y_array, series_array):
+        """显示按系列分组拟合的结果（所有系列一次算出）"""
+        # 保存结果（按系列标签排序的数组）
+        self.slope = result["slope"]
+        self.intercept = result["intercept"]
+        self.slope_uncertainty = result["slope_uncertainty"]
+        self.intercept_uncertainty = result["intercept_uncertainty"]
+        self.r_squared = result["r_squared"]
+        self.residual_std = result["residual_std"]
+        
+        # 显示结果
+        self.result_text.delete(1.0, tk.END)
+        self.result_text.insert(tk.END, "\n".join(series_result_lines(result)) + "\n")
+        if result["slope_equality"] is None:
+            self.result_text.insert(tk.END, "有效系列或数据点不足，无法检验斜率是否相等\n")
+        
+        # 更新图表
+        self.ax.clear()
+        plot_series(self.ax, x_array, y_array, series_array, result)
+        self.canvas.draw()
     
     def update_fit_plot(self, x_array, y_array, slope, intercept, slope_uncertainty, intercept_uncertainty):
         """更新拟合图"""
@@ -369,10 +563,10 @@ class LeastSquaresFitApp:
         self.ax.clear()
         
         # 绘制散点图
-        self.ax.scatter(x_array, y_array, color='blue', marker='o', label='数据点')
+        self.scatter(x_array, y_array, label='数据点')
         
         # 为了绘制平滑的拟合线，创建更多的点
-        x_min, x_max = min(x_array), max(x_array)
+        x_min, x_max = np.min(x_array), np.max(x_array)
         x_fit = np.linspace(x_min - 0.1 * (x_max - x_min), x_max + 0.1 * (x_max - x_min), 100)
         y_fit = slope * x_fit + intercept
         
@@ -398,16 +592,69 @@ class LeastSquaresFitApp:
         self.canvas.draw()
     
     def save_plot(self):
-        """保存图表为图片"""
-        if not self.x_values:
+        """在后台进程中保存图表（PNG/SVG/PDF）"""
+        if len(self.x_values) == 0:
             messagebox.showwarning("无数据", "没有数据可以保存")
             return
         
-        # 保存图表
-        import os
-        save_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'least_squares_fit.png')
-        self.fig.savefig(save_path, dpi=300, bbox_inches='tight')
-        messagebox.showinfo("保存成功", f"图表已保存为:\n{save_path}")
+        save_path = filedialog.asksaveasfilename(
+            title="保存图表",
+            initialfile="least_squares_fit.png",
+            defaultextension=".png",
+            filetypes=[("PNG图片", "*.png"), ("SVG矢量图", "*.svg"), ("PDF文档", "*.pdf")])
+        if not save_path:
+            return
+        
+        try:
+            future = self.exporter.export(self.fig, save_path)
+        except ValueError as e:
+            messagebox.showerror("保存失败", str(e))
+            return
+        self.root.after(100, self.poll_export, future, "图表已保存为")
+    
+    def export_report(self):
+        """在后台进程中导出当前数据的拟合报告（PDF和HTML）"""
+        if len(self.x_values) < 2:
+            messagebox.showwarning("数据不足", "至少需要2个数据点才能导出报告")
+            return
+        
+        output_dir = filedialog.askdirectory(title="选择报告输出目录")
+        if not output_dir:
+            return
+        
+        dataset = {"name": "least_squares_fit", "kind": "fit",
+                   "x": np.asarray(self.x_values), "y": np.asarray(self.y_values),
+                   "series": np.asarray(self.series_values)}
+        future = self.exporter.export_reports([dataset], output_dir)[0]
+        self.root.after(100, self.poll_export, future, "报告已导出为")
+    
+    def poll_export(self, future, message):
+        """轮询后台导出任务，完成后提示结果"""
+        if not future.done():
+            self.root.after(100, self.poll_export, future, message)
+            return
+        
+        try:
+            result = future.result()
+        except Exception as e:
+            messagebox.showerror("导出失败", f"导出过程中出现错误: {str(e)}")
+            return
+        paths = result if isinstance(result, list) else [result]
+        messagebox.showinfo("导出成功", message + ":\n" + "\n".join(paths))
+    
+    def on_close(self):
+        """关闭窗口时停止后台导出进程、后台线程，合并会话日志并关闭会话"""
+        self.exporter.shutdown(wait=False)
+        self.stream_cancel.set()
+        self.stream_executor.shutdown(wait=False, cancel_futures=True)
+        self.compute_executor.shutdown(wait=False, cancel_futures=True)
+        # 等待后台合并完成，再合并剩余的日志
+        if self.session.needs_compaction:
+            self.session.compact()
+        self.session.close()
+        if self.compute_client is not None:
+            self.compute_client.close()
+        self.root.destroy()
 
 def main():
     root = tk.Tk()
@@ -0,0 +1,314 @@
+"""
+会话数据持久化工具
+
+本模块用于：
+1. 以列式二进制格式（每列一个.npy文件）保存会话数据，打开时通过内存映射加载
+2. 每次添加/删除数据只向预写日志（journal）追加一条定长记录，自动保存不重写整个数据集
+3. 日志累积到一定长度后合并（compaction）为新一代列文件；界面程序可关闭自动合并，
+   定期调用compact_in_background()在后台线程中合并，合并期间仍可继续追加数据
+
+会话目录结构（g为当前代号）:
+    meta.json           代号、列名、行数、下一个ID
+    ids.g.npy           数据ID列
+    <列名>.g.npy         各数据列
+    journal.g.bin       第g代的追加日志
+
+合并时先写新一代的列文件和空日志，再原子替换meta.json，最后删除旧文件，
+因此任何时刻崩溃都只会读到完整的一代数据及其日志；日志末尾写了一半的记录在打开时被截掉。
+后台合并只回放开始时已有的日志记录，合并期间追加的记录在切换前复制到新一代日志中。
+
+作者: Cascade
+日期: 2025-03-26
+"""
+
+import os
+import json
+import threading
+
+import numpy as np
+
+FORMAT_VERSION = 1
+
+# 日志操作类型
+OP_ADD = 1
+OP_DELETE = 2
+
+# 日志记录数超过 max(COMPACT_MIN_RECORDS, 已合并行数) 时自动合并
+COMPACT_MIN_RECORDS = 4096
+
+
+def _fsync_dir(path):
+    """同步目录项，保证重命名/新建文件落盘（Windows不支持时忽略）"""
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+class SessionStore:
+    """列式会话存储：内存映射的列文件 + 追加写入的日志"""
+
+    def __init__(self, path, columns=("x", "y"), fsync=True, compact_min_records=COMPACT_MIN_RECORDS,
+                 fill_value=0.0, auto_compact=True):
+        self.path = path
+        self.columns = tuple(columns)
+        self.fsync = fsync
+        self.compact_min_records = compact_min_records
+        self.fill_value = fill_value
+        self.auto_compact = auto_compact
+        self._journal = None
+        self._compact_thread = None
+        # _lock保护日志和meta；_compact_lock保证同一时刻只有一个合并/清空在进行
+        self._lock = threading.RLock()
+        self._compact_lock = threading.RLock()
+        self.record_dtype = np.dtype([
+            ("op", "u1"),
+            ("id", "<i8"),
+            ("values", "<f8", (len(self.columns),)),
+        ])
+
+        os.makedirs(path, exist_ok=True)
+        self.meta = self._read_meta()
+        if self.meta is None:
+            self.meta = {"format": FORMAT_VERSION, "generation": 0, "columns": list(self.columns),
+                         "count": 0, "next_id": 1}
+            self._write_columns(0, np.empty(0, dtype=np.int64),
+                                {name: np.empty(0) for name in self.columns})
+            self._write_meta(self.meta)
+        elif self.meta["columns"] != list(self.columns):
+            self._migrate_columns(self.meta["columns"])
+        else:
+            self._remove_stale_files()
+
+        if self._journal is None:
+            self._journal = self._open_journal(self.meta["generation"])
+
+    def _migrate_columns(self, old_columns):
+        """旧会话缺少的列用fill_value补齐，合并为新一代"""
+        missing = set(old_columns) - set(self.columns)
+        if missing:
+            raise ValueError(f"会话列不匹配: {old_columns} != {list(self.columns)}")
+
+        old_store = SessionStore(self.path, old_columns, self.fsync, self.compact_min_records)
+        try:
+            ids, old_data, next_id = old_store.load()
+            columns = {name: old_data[name] if name in old_data else np.full(len(ids), self.fill_value)
+                       for name in self.columns}
+            self.meta = dict(old_store.meta, columns=list(self.columns))
+            self._switch_generation(ids, columns, next_id)
+        finally:
+            old_store.close()
+
+    def _file(self, name, generation):
+        return os.path.join(self.path, f"{name}.{generation}.npy")
+
+    def _journal_path(self, generation):
+        return os.path.join(self.path, f"journal.{generation}.bin")
+
+    def _read_meta(self):
+        try:
+            with open(os.path.join(self.path, "meta.json"), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def _write_meta(self, meta):
+        """写入临时文件后原子替换meta.json"""
+        tmp_path = os.path.join(self.path, "meta.json.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False)
+            f.flush()
+            if self.fsync:
+                os.fsync(f.fileno())
+        os.replace(tmp_path, os.path.join(self.path, "meta.json"))
+        if self.fsync:
+            _fsync_dir(self.path)
+
+    def _write_columns(self, generation, ids, columns):
+        """写入一代列文件和空日志"""
+        arrays = {"ids": np.ascontiguousarray(ids, dtype=np.int64)}
+        arrays.update({name: np.ascontiguousarray(columns[name], dtype=np.float64)
+                       for name in self.columns})
+        for name, array in arrays.items():
+            with open(self._file(name, generation), "wb") as f:
+                np.save(f, array)
+                f.flush()
+                if self.fsync:
+                    os.fsync(f.fileno())
+        open(self._journal_path(generation), "wb").close()
+
+    def _open_journal(self, generation):
+        """打开日志用于追加，截掉末尾不完整的记录"""
+        journal_path = self._journal_path(generation)
+        journal = open(journal_path, "ab")
+        size = journal.seek(0, os.SEEK_END)
+        complete = size - size % self.record_dtype.itemsize
+        if complete != size:
+            journal.truncate(complete)
+            journal.seek(complete)
+        self.journal_records = complete // self.record_dtype.itemsize
+        return journal
+
+    def _load_column(self, name, meta):
+        generation = meta["generation"]
+        if meta["count"] == 0:
+            return np.load(self._file(name, generation))
+        return np.load(self._file(name, generation), mmap_mode="r")
+
+    def load(self):
+        """
+        加载会话数据，返回 (ids, {列名: 数组}, next_id)
+
+        没有待回放的日志时直接返回内存映射数组，不复制数据。
+        """
+        with self._lock:
+            self._journal.flush()
+            return self._replay(self.meta, self.journal_records)
+
+    def _replay(self, meta, count):
+        """读取meta所指的一代列文件，并回放其日志的前count条记录"""
+        generation = meta["generation"]
+        ids = self._load_column("ids", meta)
+        columns = {name: self._load_column(name, meta) for name in self.columns}
+        next_id = meta["next_id"]
+
+        records = np.fromfile(self._journal_path(generation), dtype=self.record_dtype, count=count)
+        if len(records) == 0:
+            return ids, columns, next_id
+
+        added = records[records["op"] == OP_ADD]
+        deleted = records["id"][records["op"] == OP_DELETE]
+        ids = np.concatenate([ids, added["id"]])
+        columns = {name: np.concatenate([columns[name], added["values"][:, i]])
+                   for i, name in enumerate(self.columns)}
+        if len(deleted):
+            keep = ~np.isin(ids, deleted)
+            ids = ids[keep]
+            columns = {name: array[keep] for name, array in columns.items()}
+        next_id = max(next_id, int(records["id"].max()) + 1)
+        return ids, columns, next_id
+
+    def _append_records(self, records):
+        with self._lock:
+            self._journal.write(records.tobytes())
+            self._journal.flush()
+            if self.fsync:
+                os.fsync(self._journal.fileno())
+            self.journal_records += len(records)
+        if self.auto_compact and self.needs_compaction:
+            self.compact()
+
+    @property
+    def needs_compaction(self):
+        """日志记录数是否已超过 max(compact_min_records, 已合并行数)"""
+        return self.journal_records > max(self.compact_min_records, self.meta["count"])
+
+    def append(self, data_id, values):
+        """追加一行数据"""
+        records = np.zeros(1, dtype=self.record_dtype)
+        records["op"] = OP_ADD
+        records["id"] = data_id
+        records["values"][0] = values
+        self._append_records(records)
+
+    def delete(self, data_ids):
+        """按ID删除数据"""
+        data_ids = np.asarray(data_ids, dtype=np.int64).ravel()
+        if len(data_ids) == 0:
+            return
+        records = np.zeros(len(data_ids), dtype=self.record_dtype)
+        records["op"] = OP_DELETE
+        records["id"] = data_ids
+        records["values"] = np.nan
+        self._append_records(records)
+
+    def clear(self):
+        """清空会话（直接合并为空的一代，并重置ID；等待正在进行的合并完成）"""
+        empty = {name: np.empty(0) for name in self.columns}
+        with self._compact_lock, self._lock:
+            self._switch_generation(np.empty(0, dtype=np.int64), empty, next_id=1)
+
+    def compact(self):
+        """
+        把日志合并进新一代列文件
+
+        只在读取日志长度和最后切换时持有锁，重写列文件期间其他线程仍可追加记录，
+        这些记录在切换前复制到新一代日志中。
+        """
+        with self._compact_lock:
+            with self._lock:
+                self._journal.flush()
+                meta = self.meta
+                count = self.journal_records
+            ids, columns, next_id = self._replay(meta, count)
+            self._write_columns(meta["generation"] + 1, ids, columns)
+
+            with self._lock:
+                tail = np.fromfile(self._journal_path(meta["generation"]), dtype=self.record_dtype,
+                                   count=self.journal_records - count,
+                                   offset=count * self.record_dtype.itemsize)
+                if len(tail):
+                    with open(self._journal_path(meta["generation"] + 1), "ab") as journal:
+                        journal.write(tail.tobytes())
+                        journal.flush()
+                        if self.fsync:
+                            os.fsync(journal.fileno())
+                self._switch_generation(ids, columns, next_id, written=True)
+
+    def compact_in_background(self):
+        """需要合并且没有正在进行的合并时，在后台线程中合并；返回启动的线程或None"""
+        if not self.needs_compaction or (self._compact_thread is not None and self._compact_thread.is_alive()):
+            return None
+        self._compact_thread = threading.Thread(target=self.compact, name="session-compact")
+        self._compact_thread.start()
+        return self._compact_thread
+
+    def _switch_generation(self, ids, columns, next_id, written=False):
+        old_generation = self.meta["generation"]
+        generation = old_generation + 1
+        if not written:
+            self._write_columns(generation, ids, columns)
+
+        meta = dict(self.meta, generation=generation, count=int(len(ids)), next_id=int(next_id))
+        self._write_meta(meta)
+        self.meta = meta
+
+        if self._journal is not None:
+            self._journal.close()
+        self._journal = self._open_journal(generation)
+
+        # 新一代已生效，删除旧文件（Windows上仍被映射的文件可能删除失败，下次打开时再清理）
+        for name in ("ids",) + self.columns:
+            self._remove(self._file(name, old_generation))
+        self._remove(self._journal_path(old_generation))
+
+    def _remove_stale_files(self):
+        """删除非当前代的列文件和日志（上次合并中断或删除失败留下的）"""
+        current = str(self.meta["generation"])
+        for filename in os.listdir(self.path):
+            parts = filename.split(".")
+            if len(parts) == 3 and parts[2] in ("npy", "bin") and parts[1].isdigit() \
+                    and parts[1] != current:
+                self._remove(os.path.join(self.path, filename))
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def close(self):
+        """关闭会话（先等待后台合并完成）"""
+        if self._compact_thread is not None:
+            self._compact_thread.join()
+        with self._lock:
+            if self._journal is not None:
+                self._journal.close()
+                self._journal = None
@@ -0,0 +1,252 @@
+"""
+超大数据文件的分块流式计算
+
+本模块用于对超出内存的长时间记录数据做最小二乘拟合和不确定度计算：
+1. 按块读取内存映射文件（.npy、原始float64二进制）或文本文件（.csv/.txt）
+2. 每块只计算充分统计量（n、均值、中心化二阶矩），各块在线程/进程池中并行计算
+3. 用Chan等人的并行合并公式两两合并各块统计量，结果与内存计算在浮点误差范围内一致
+
+合并公式（a、b两块，n = n_a + n_b，δx = x̄_b - x̄_a，δy = ȳ_b - ȳ_a）:
+    x̄ = x̄_a + δx·n_b/n
+    Sxx = Sxx_a + Sxx_b + δx²·n_a·n_b/n
+    Sxy = Sxy_a + Sxy_b + δx·δy·n_a·n_b/n
+
+命令行:
+    python streaming_stats.py fit 数据文件 [--columns 0 1] [--workers 8]
+    python streaming_stats.py uncertainty 数据文件 [--column 0] [--precision 0.01] [--level 0.9545]
+
+作者: Cascade
+日期: 2025-03-26
+"""
+
+import io
+import os
+import sys
+import argparse
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, CancelledError, wait, FIRST_EXCEPTION
+
+import numpy as np
+
+from data_analysis import fit_from_moments, uncertainty_from_moments
+
+# 每块的行数（两列float64约128 MB）
+CHUNK_ROWS = 8 * 1024 * 1024
+
+# 文本文件每块的字节数
+CHUNK_BYTES = 64 * 1024 * 1024
+
+TEXT_EXTENSIONS = (".csv", ".txt", ".dat")
+
+# 检查取消标志的间隔（秒）
+CANCEL_POLL_INTERVAL = 0.1
+
+
+class Moments:
+    """二维数据(x,y)的充分统计量，可由数组计算，也可按Chan等人的公式合并"""
+
+    __slots__ = ("n", "mean_x", "mean_y", "sxx", "syy", "sxy")
+
+    def __init__(self, n=0, mean_x=0.0, mean_y=0.0, sxx=0.0, syy=0.0, sxy=0.0):
+        self.n = n
+        self.mean_x = mean_x
+        self.mean_y = mean_y
+        self.sxx = sxx
+        self.syy = syy
+        self.sxy = sxy
+
+    @classmethod
+    def from_arrays(cls, x_array, y_array):
+        """由一块数据计算统计量（块内先中心化，避免大数相减损失精度）"""
+        x_array = np.asarray(x_array, dtype=np.float64)
+        y_array = np.asarray(y_array, dtype=np.float64)
+        n = len(x_array)
+        if n == 0:
+            return cls()
+        mean_x = float(np.mean(x_array))
+        mean_y = float(np.mean(y_array))
+        dx = x_array - mean_x
+        dy = y_array - mean_y
+        return cls(n, mean_x, mean_y, float(np.dot(dx, dx)), float(np.dot(dy, dy)), float(np.dot(dx, dy)))
+
+    def merge(self, other):
+        """合并两块的统计量，返回新对象"""
+        if other.n == 0:
+            return self
+        if self.n == 0:
+            return other
+        n = self.n + other.n
+        delta_x = other.mean_x - self.mean_x
+        delta_y = other.mean_y - self.mean_y
+        weight = self.n * other.n / n
+        return Moments(
+            n,
+            self.mean_x + delta_x * other.n / n,
+            self.mean_y + delta_y * other.n / n,
+            self.sxx + other.sxx + delta_x * delta_x * weight,
+            self.syy + other.syy + delta_y * delta_y * weight,
+            self.sxy + other.sxy + delta_x * delta_y * weight,
+        )
+
+    @staticmethod
+    def merge_all(parts):
+        """两两分层合并（比顺序累加的误差增长更慢）"""
+        parts = list(parts)
+        if not parts:
+            return Moments()
+        while len(parts) > 1:
+            merged = [a.merge(b) for a, b in zip(parts[0::2], parts[1::2])]
+            if len(parts) % 2:
+                merged.append(parts[-1])
+            parts = merged
+        return parts[0]
+
+
+def open_array(path, raw_columns=None):
+    """以内存映射方式打开数值文件，返回二维数组（行 × 列）"""
+    if path.lower().endswith(".npy"):
+        array = np.load(path, mmap_mode="r")
+    else:
+        if raw_columns is None:
+            raise ValueError("原始二进制文件需指定每行的列数")
+        array = np.memmap(path, dtype="<f8", mode="r")
+        if len(array) % raw_columns:
+            raise ValueError("文件大小与列数不匹配")
+        array = array.reshape(-1, raw_columns)
+    return array.reshape(len(array), -1)
+
+
+def _array_chunk_moments(path, raw_columns, columns, start, stop):
+    """计算数值文件中 [start, stop) 行的统计量（在工作线程/进程中各自打开内存映射）"""
+    block = open_array(path, raw_columns)[start:stop]
+    x_column, y_column = columns
+    return Moments.from_arrays(block[:, x_column], block[:, y_column])
+
+
+def text_chunks(path, chunk_bytes=CHUNK_BYTES):
+    """把文本文件按字节切成若干块，块边界对齐到行尾，返回 [(起始, 结束), ...]"""
+    size = os.path.getsize(path)
+    bounds = [0]
+    with open(path, "rb") as f:
+        while bounds[-1] < size:
+            f.seek(min(bounds[-1] + chunk_bytes, size))
+            f.readline()
+            bounds.append(min(f.tell(), size))
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def _text_chunk_moments(path, columns, delimiter, start, stop):
+    """解析文本文件 [start, stop) 字节范围的数据并计算统计量，以'#'开头的行和无法解析的表头被跳过"""
+    with open(path, "rb") as f:
+        f.seek(start)
+        data = f.read(stop - start)
+    try:
+        block = np.loadtxt(io.BytesIO(data), delimiter=delimiter, ndmin=2, comments="#",
+                           usecols=sorted(set(columns)))
+    except ValueError:
+        if start != 0:
+            raise
+        # 首块可能带表头，跳过第一行再解析
+        block = np.loadtxt(io.BytesIO(data), delimiter=delimiter, ndmin=2, comments="#",
+                           usecols=sorted(set(columns)), skiprows=1)
+    if block.size == 0:
+        return Moments()
+    index = {column: i for i, column in enumerate(sorted(set(columns)))}
+    x_column, y_column = columns
+    return Moments.from_arrays(block[:, index[x_column]], block[:, index[y_column]])
+
+
+def stream_moments(path, columns=(0, 1), raw_columns=None, delimiter=",", chunk_rows=CHUNK_ROWS,
+                   chunk_bytes=CHUNK_BYTES, workers=None, executor="auto", cancel_event=None):
+    """
+    分块并行计算整个文件的统计量
+
+    executor为"thread"、"process"或"auto"（数值文件用线程：numpy在计算时释放GIL，
+    且内存映射页由各线程共享；文本文件解析受GIL限制，用进程）。
+    cancel_event（threading.Event）被设置后不再开始新的块，正在计算的块完成后抛出CancelledError。
+    """
+    is_text = path.lower().endswith(TEXT_EXTENSIONS)
+    if executor == "auto":
+        executor = "process" if is_text else "thread"
+    pool_class = ProcessPoolExecutor if executor == "process" else ThreadPoolExecutor
+
+    if is_text:
+        tasks = [(_text_chunk_moments, path, tuple(columns), delimiter, start, stop)
+                 for start, stop in text_chunks(path, chunk_bytes)]
+    else:
+        total = len(open_array(path, raw_columns))
+        tasks = [(_array_chunk_moments, path, raw_columns, tuple(columns), start, min(start + chunk_rows, total))
+                 for start in range(0, total, chunk_rows)]
+
+    if len(tasks) <= 1:
+        return Moments.merge_all(task[0](*task[1:]) for task in tasks)
+    with pool_class(max_workers=workers) as pool:
+        futures = [pool.submit(_run_task, task) for task in tasks]
+        pending = futures
+        while pending:
+            done, pending = wait(pending, timeout=CANCEL_POLL_INTERVAL, return_when=FIRST_EXCEPTION)
+            failed = (cancel_event is not None and cancel_event.is_set()) \
+                or any(future.exception() is not None for future in done)
+            if failed:
+                for future in pending:
+                    future.cancel()
+                break
+    # 退出with时正在计算的块已完成；先报告块内的错误，再报告取消
+    errors = [future.exception() for future in futures
+              if not future.cancelled() and future.exception() is not None]
+    if errors:
+        raise errors[0]
+    if cancel_event is not None and cancel_event.is_set():
+        raise CancelledError("流式计算已取消")
+    return Moments.merge_all(future.result() for future in futures)
+
+
+def _run_task(task):
+    return task[0](*task[1:])
+
+
+def stream_fit(path, columns=(0, 1), **kwargs):
+    """对文件中的(x,y)两列做流式最小二乘拟合，结果格式与data_analysis.linear_fit一致"""
+    moments = stream_moments(path, columns, **kwargs)
+    return fit_from_moments(moments.n, moments.mean_x, moments.mean_y,
+                            moments.sxx, moments.syy, moments.sxy)
+
+
+def stream_uncertainty(path, column=0, instrument_precision=0.0, distribution="均匀分布",
+                       confidence_factor=2.0, confidence_level=None, type_b_dof=np.inf, **kwargs):
+    """对文件中的一列做流式不确定度计算，结果格式与data_analysis.calculate_uncertainty一致"""
+    moments = stream_moments(path, (column, column), **kwargs)
+    return uncertainty_from_moments(moments.n, moments.mean_y, moments.syy, instrument_precision,
+                                    distribution, confidence_factor, confidence_level, type_b_dof)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="超大数据文件的分块流式拟合/不确定度计算")
+    parser.add_argument("mode", choices=("fit", "uncertainty"), help="计算类型")
+    parser.add_argument("path", help="数据文件（.npy、.csv/.txt/.dat，或原始float64二进制）")
+    parser.add_argument("--columns", type=int, nargs=2, default=(0, 1), help="拟合使用的x、y列号")
+    parser.add_argument("--column", type=int, default=0, help="不确定度计算使用的列号")
+    parser.add_argument("--raw-columns", type=int, default=None, help="原始二进制文件每行的列数")
+    parser.add_argument("--delimiter", default=",", help="文本文件分隔符")
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS, help="数值文件每块行数")
+    parser.add_argument("--workers", type=int, default=None, help="并行线程/进程数")
+    parser.add_argument("--executor", choices=("auto", "thread", "process"), default="auto")
+    parser.add_argument("--precision", type=float, default=0.0, help="仪器精度")
+    parser.add_argument("--distribution", default="均匀分布", help="B类不确定度分布")
+    parser.add_argument("--k", type=float, default=2.0, help="置信系数k（未给出--level时使用）")
+    parser.add_argument("--level", type=float, default=None, help="置信水平，给出时k由有效自由度计算")
+    args = parser.parse_args(argv)
+
+    options = {"raw_columns": args.raw_columns, "delimiter": args.delimiter,
+               "chunk_rows": args.chunk_rows, "workers": args.workers, "executor": args.executor}
+    if args.mode == "fit":
+        result = stream_fit(args.path, tuple(args.columns), **options)
+    else:
+        result = stream_uncertainty(args.path, args.column, args.precision, args.distribution,
+                                    args.k, args.level, **options)
+    for key, value in result.items():
+        print(f"{key}: {value}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
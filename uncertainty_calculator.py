@@ -5,19 +5,48 @@
 1. A类不确定度（统计不确定度）
 2. B类不确定度（仪器不确定度）
 3. 合成不确定度
-4. 扩展不确定度
+4. 扩展不确定度（包含因子k可手动输入，或由Welch–Satterthwaite有效自由度查t分布表得到）
+
+数据自动保存到会话目录，重新打开程序时恢复。
+超出内存的数据文件可用"大文件计算"分块流式计算。
+设置环境变量 LAB_COMPUTE_SERVER 后，不确定度计算交给本地计算服务（compute_server.py）完成。
+"参数扫描"窗口对仪器精度、置信系数k、样本数量n的网格一次广播计算不确定度，并绘制热力图/等高线图。
 
 作者: Cascade
 日期: 2025-03-26
 """
 
+import os
+import time
+import threading
 import numpy as np
 import tkinter as tk
-from tkinter import ttk, messagebox, scrolledtext
+from tkinter import ttk, messagebox, scrolledtext, filedialog
+from concurrent.futures import ThreadPoolExecutor
 import matplotlib.pyplot as plt
 from matplotlib.figure import Figure
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg, NavigationToolbar2Tk
-from scipy import stats
+
+from compute_client import ComputeClient, ServiceError
+from data_analysis import DISTRIBUTION_DIVISORS, T_TABLE, uncertainty_sweep, calculate_uncertainty
+from session_store import SessionStore
+from streaming_stats import stream_uncertainty
+
+# 会话数据目录（每次添加/删除数据即自动保存）
+SESSION_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'uncertainty_calculator.session')
+
+# 置信水平选项：手动输入k，或按t分布表中的置信水平自动计算k
+MANUAL_FACTOR = "手动输入k"
+CONFIDENCE_LEVELS = {f"{level * 100:g}%": level for level in T_TABLE}
+
+# 计算服务请求超时（秒）
+SERVICE_TIMEOUT = 5
+
+# 检查会话日志是否需要合并的间隔（毫秒）
+COMPACT_INTERVAL_MS = 5000
+
+# 表格中显示的最大行数（只显示最近的数据，全部数据仍参与计算和绘图）
+TREE_MAX_ROWS = 1000
 
 class UncertaintyCalculator:
     def __init__(self, root):
@@ -31,9 +60,9 @@ class UncertaintyCalculator:
         self.style.configure("TButton", font=("微软雅黑", 10))
         self.style.configure("TLabel", font=("微软雅黑", 10))
         
-        # 数据存储
-        self.data_values = []
-        self.data_ids = []
+        # 数据存储（numpy数组，会话数据为内存映射）
+        self.data_values = np.empty(0)
+        self.data_ids = np.empty(0, dtype=np.int64)
         self.next_id = 1
         
         # 不确定度结果
@@ -42,9 +71,28 @@ class UncertaintyCalculator:
         self.uc = None  # 合成不确定度
         self.ue = None  # 扩展不确定度
         
+        # 计算服务客户端（未配置时为None，在本地计算）；请求在单独的后台线程中发送，
+        # 超时后退回本地计算
+        self.compute_client = ComputeClient.from_env(timeout=SERVICE_TIMEOUT)
+        self.compute_executor = ThreadPoolExecutor(max_workers=1)
+        
+        # 大文件流式计算在后台线程中进行；关闭窗口时设置取消标志，计算在当前块完成后停止
+        self.stream_executor = ThreadPoolExecutor(max_workers=1)
+        self.stream_cancel = threading.Event()
+        
+        # 会话存储（日志由定时任务在后台线程中合并，不在添加数据时重写整个数据集）
+        self.session = SessionStore(SESSION_PATH, columns=("value",), auto_compact=False)
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+        
         # 创建界面
         self.create_widgets()
         
+        # 恢复上次的数据
+        self.load_session()
+        
+        # 定期检查是否需要合并会话日志
+        self.root.after(COMPACT_INTERVAL_MS, self.schedule_compaction)
+        
     def create_widgets(self):
         # 创建主框架
         main_frame = ttk.Frame(self.root, padding="10")
@@ -80,6 +128,28 @@ class UncertaintyCalculator:
         self.confidence_entry.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=5)
         self.confidence_entry.insert(0, "2.0")  # 默认值为2，对应约95%置信度
         
+        # 置信水平选择（非手动时k由有效自由度自动计算）
+        level_frame = ttk.Frame(input_frame)
+        level_frame.pack(fill=tk.X, pady=5)
+        
+        ttk.Label(level_frame, text="置信水平:").pack(side=tk.LEFT)
+        self.level_var = tk.StringVar(value="95.45%")
+        level_combobox = ttk.Combobox(level_frame,
+                                      textvariable=self.level_var,
+                                      values=[MANUAL_FACTOR] + list(CONFIDENCE_LEVELS))
+        level_combobox.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=5)
+        level_combobox.state(["readonly"])
+        level_combobox.bind("<<ComboboxSelected>>", self.update_confidence_entry)
+        self.update_confidence_entry()
+        
+        # B类不确定度自由度输入（留空表示无穷大）
+        dof_frame = ttk.Frame(input_frame)
+        dof_frame.pack(fill=tk.X, pady=5)
+        
+        ttk.Label(dof_frame, text="B类自由度(空=∞):").pack(side=tk.LEFT)
+        self.type_b_dof_entry = ttk.Entry(dof_frame)
+        self.type_b_dof_entry.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=5)
+        
         # 分布类型选择
         distribution_frame = ttk.Frame(input_frame)
         distribution_frame.pack(fill=tk.X, pady=5)
@@ -100,12 +170,15 @@ class UncertaintyCalculator:
         ttk.Button(button_frame, text="删除选中", command=self.delete_selected_data).pack(side=tk.LEFT, padx=5)
         ttk.Button(button_frame, text="清除所有", command=self.clear_data).pack(side=tk.LEFT, padx=5)
         ttk.Button(button_frame, text="计算不确定度", command=self.calculate_uncertainty).pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="参数扫描", command=self.open_sweep_window).pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="大文件计算", command=self.calculate_file_uncertainty).pack(side=tk.LEFT, padx=5)
         
         # 数据显示区域
         data_display_frame = ttk.Frame(input_frame)
         data_display_frame.pack(fill=tk.BOTH, expand=True, pady=10)
         
-        ttk.Label(data_display_frame, text="已输入的数据:").pack(anchor=tk.W)
+        self.count_label = ttk.Label(data_display_frame, text="已输入的数据:")
+        self.count_label.pack(anchor=tk.W)
         
         # 创建表格
         columns = ("ID", "数据值")
@@ -167,7 +240,12 @@ class UncertaintyCalculator:
 
 5. 扩展不确定度:
    U = k × u_c
-   其中，k为置信系数（通常取k=2，对应约95%置信水平）
+   其中，k为置信系数（手动输入时通常取k=2，对应约95%置信水平）
+
+6. 有效自由度与包含因子（选择置信水平时）:
+   ν_eff = u_c⁴ / [u_A⁴/(n-1) + u_B⁴/ν_B]
+   k = t_p(ν_eff)
+   其中，ν_B为B类不确定度的自由度（留空表示ν_B = ∞），t_p为置信水平p下的t分布分位数
         """
         formula_text.insert(tk.END, formulas)
         formula_text.configure(state="disabled")
@@ -202,21 +280,59 @@ class UncertaintyCalculator:
         finally:
             self.context_menu.grab_release()
     
+    def schedule_compaction(self):
+        """日志过长时在后台线程中合并会话，之后继续定期检查"""
+        self.session.compact_in_background()
+        self.root.after(COMPACT_INTERVAL_MS, self.schedule_compaction)
+    
+    def load_session(self):
+        """从会话存储恢复数据（直接使用内存映射数组，不转换为Python列表）"""
+        ids, columns, self.next_id = self.session.load()
+        self.data_ids = ids
+        self.data_values = columns["value"]
+        
+        self.refresh_tree()
+        if len(self.data_ids):
+            self.update_plot()
+    
+    def refresh_tree(self):
+        """重建表格，只显示最近TREE_MAX_ROWS条数据"""
+        self.data_tree.delete(*self.data_tree.get_children())
+        start = max(0, len(self.data_ids) - TREE_MAX_ROWS)
+        for data_id, value in zip(self.data_ids[start:].tolist(), self.data_values[start:].tolist()):
+            self.data_tree.insert("", tk.END, values=(data_id, value))
+        self.update_count_label()
+    
+    def update_count_label(self):
+        """更新表格上方的数据计数"""
+        count = len(self.data_ids)
+        if count > TREE_MAX_ROWS:
+            self.count_label.config(text=f"已输入的数据（共{count}个，表格显示最近{TREE_MAX_ROWS}个）:")
+        else:
+            self.count_label.config(text="已输入的数据:")
+    
     def add_data(self):
         """添加数据到列表"""
         try:
             value = float(self.data_entry.get())
             
-            # 添加到数据列表
-            self.data_values.append(value)
+            # 添加到数据数组
+            self.data_values = np.append(self.data_values, value)
             
             # 记录数据ID
             data_id = self.next_id
-            self.data_ids.append(data_id)
+            self.data_ids = np.append(self.data_ids, data_id)
             self.next_id += 1
             
-            # 更新表格
+            # 写入会话日志
+            self.session.append(data_id, (value,))
+            
+            # 更新表格（超出显示行数时移除最早的一行）
             self.data_tree.insert("", tk.END, values=(data_id, value))
+            items = self.data_tree.get_children()
+            if len(items) > TREE_MAX_ROWS:
+                self.data_tree.delete(items[0])
+            self.update_count_label()
             
             # 清空输入框
             self.data_entry.delete(0, tk.END)
@@ -237,22 +353,19 @@ class UncertaintyCalculator:
         
         # 确认删除
         if messagebox.askyesno("确认删除", f"确定要删除选中的 {len(selected_items)} 项数据吗？"):
-            for item in selected_items:
-                # 获取数据ID
-                data_id = int(self.data_tree.item(item, "values")[0])
-                
-                # 查找数据在列表中的索引
-                try:
-                    idx = self.data_ids.index(data_id)
-                    
-                    # 从数据列表中删除
-                    del self.data_values[idx]
-                    del self.data_ids[idx]
-                    
-                    # 从表格中删除
-                    self.data_tree.delete(item)
-                except ValueError:
-                    continue
+            # 获取数据ID
+            deleted_ids = [int(self.data_tree.item(item, "values")[0]) for item in selected_items]
+            
+            # 从数据数组中删除
+            keep = ~np.isin(self.data_ids, deleted_ids)
+            self.data_values = self.data_values[keep]
+            self.data_ids = self.data_ids[keep]
+            
+            # 写入会话日志
+            self.session.delete(deleted_ids)
+            
+            # 更新表格（补上被删除行之前的数据）
+            self.refresh_tree()
             
             # 更新图表
             self.update_plot()
@@ -271,13 +384,13 @@ class UncertaintyCalculator:
         # 确认清除
         if messagebox.askyesno("确认清除", "确定要清除所有数据吗？"):
             # 清空数据
-            self.data_values = []
-            self.data_ids = []
+            self.data_values = np.empty(0)
+            self.data_ids = np.empty(0, dtype=np.int64)
             self.next_id = 1
+            self.session.clear()
             
             # 清空表格
-            for item in self.data_tree.get_children():
-                self.data_tree.delete(item)
+            self.refresh_tree()
             
             # 清空图表
             self.ax.clear()
@@ -296,7 +409,7 @@ class UncertaintyCalculator:
     
     def update_plot(self):
         """更新数据分布图"""
-        if not self.data_values:
+        if len(self.data_values) == 0:
             self.ax.clear()
             self.ax.grid(True, linestyle='--', alpha=0.7)
             self.ax.set_title('数据分布与不确定度', fontsize=12)
@@ -329,66 +442,278 @@ class UncertaintyCalculator:
         # 更新画布
         self.canvas.draw()
     
+    def update_confidence_entry(self, event=None):
+        """只有选择"手动输入k"时置信系数k输入框才可编辑"""
+        if self.level_var.get() == MANUAL_FACTOR:
+            self.confidence_entry.state(["!disabled"])
+        else:
+            self.confidence_entry.state(["disabled"])
+    
+    def read_settings(self):
+        """读取仪器精度、分布、置信系数/置信水平和B类自由度"""
+        instrument_precision = float(self.instrument_entry.get())
+        confidence_level = CONFIDENCE_LEVELS.get(self.level_var.get())
+        confidence_factor = float(self.confidence_entry.get()) if confidence_level is None else None
+        type_b_dof_text = self.type_b_dof_entry.get().strip()
+        type_b_dof = float(type_b_dof_text) if type_b_dof_text else np.inf
+        if type_b_dof <= 0:
+            raise ValueError("B类自由度必须为正数")
+        return instrument_precision, self.distribution_var.get(), confidence_factor, confidence_level, type_b_dof
+    
+    def show_result(self, result, confidence_level, source=None):
+        """在结果区域显示不确定度计算结果（confidence_level取自界面设置，None表示手动输入k）"""
+        mean_value = result["mean"]
+        ue = result["ue"]
+        confidence_factor = result["confidence_factor"]
+        
+        self.result_text.delete(1.0, tk.END)
+        if source:
+            self.result_text.insert(tk.END, f"数据文件: {source}\n")
+        self.result_text.insert(tk.END, f"数据均值: {mean_value:.6f}\n")
+        self.result_text.insert(tk.END, f"样本标准差: {result['std_dev']:.6f}\n")
+        self.result_text.insert(tk.END, f"样本数量: {result['n']}\n\n")
+        
+        self.result_text.insert(tk.END, f"A类不确定度 (u_A): {result['ua']:.6f}\n")
+        self.result_text.insert(tk.END, f"B类不确定度 (u_B): {result['ub']:.6f} ({result['distribution']})\n")
+        self.result_text.insert(tk.END, f"合成不确定度 (u_c): {result['uc']:.6f}\n")
+        self.result_text.insert(tk.END, f"有效自由度 (ν_eff): {result['dof_eff']:.2f}\n")
+        if confidence_level is None:
+            self.result_text.insert(tk.END, f"扩展不确定度 (U=k×u_c): {ue:.6f} (k={confidence_factor})\n\n")
+        else:
+            self.result_text.insert(tk.END, f"扩展不确定度 (U=k×u_c): {ue:.6f} "
+                                            f"(k=t_p(ν_eff)={confidence_factor:.4f}, p={confidence_level * 100:g}%)\n\n")
+        
+        self.result_text.insert(tk.END, f"最终测量结果表示为:\n")
+        self.result_text.insert(tk.END, f"X = ({mean_value:.6f} ± {ue:.6f})")
+    
     def calculate_uncertainty(self):
         """计算不确定度"""
         if len(self.data_values) < 2:
             messagebox.showwarning("数据不足", "至少需要2个数据点才能计算不确定度")
             return
         
+        # 获取仪器精度、置信系数/置信水平和B类自由度
         try:
-            # 获取仪器精度和置信系数
-            instrument_precision = float(self.instrument_entry.get())
-            confidence_factor = float(self.confidence_entry.get())
-            
-            # 计算A类不确定度
-            data_array = np.array(self.data_values)
-            mean_value = np.mean(data_array)
-            std_dev = np.std(data_array, ddof=1)  # 样本标准差，ddof=1表示无偏估计
-            n = len(data_array)
-            ua = std_dev / np.sqrt(n)
-            
-            # 计算B类不确定度
-            distribution = self.distribution_var.get()
-            if distribution == "均匀分布":
-                ub = instrument_precision / np.sqrt(3)
-            elif distribution == "正态分布":
-                ub = instrument_precision / 3
-            elif distribution == "三角分布":
-                ub = instrument_precision / np.sqrt(6)
-            else:
-                ub = instrument_precision / np.sqrt(3)  # 默认使用均匀分布
-            
-            # 计算合成不确定度
-            uc = np.sqrt(ua**2 + ub**2)
-            
-            # 计算扩展不确定度
-            ue = confidence_factor * uc
-            
-            # 保存结果
-            self.ua = ua
-            self.ub = ub
-            self.uc = uc
-            self.ue = ue
-            
-            # 显示结果
+            settings = self.read_settings()
+        except ValueError:
+            messagebox.showerror("输入错误", "请确保仪器精度、置信系数和B类自由度为有效的数值")
+            return
+        
+        # 使用计算服务时在后台线程中请求，服务无响应也不阻塞界面
+        if self.compute_client is not None:
+            future = self.compute_executor.submit(self.compute_client.uncertainty, self.data_values, *settings)
             self.result_text.delete(1.0, tk.END)
-            self.result_text.insert(tk.END, f"数据均值: {mean_value:.6f}\n")
-            self.result_text.insert(tk.END, f"样本标准差: {std_dev:.6f}\n")
-            self.result_text.insert(tk.END, f"样本数量: {n}\n\n")
-            
-            self.result_text.insert(tk.END, f"A类不确定度 (u_A): {ua:.6f}\n")
-            self.result_text.insert(tk.END, f"B类不确定度 (u_B): {ub:.6f} ({distribution})\n")
-            self.result_text.insert(tk.END, f"合成不确定度 (u_c): {uc:.6f}\n")
-            self.result_text.insert(tk.END, f"扩展不确定度 (U=k×u_c): {ue:.6f} (k={confidence_factor})\n\n")
-            
-            self.result_text.insert(tk.END, f"最终测量结果表示为:\n")
-            self.result_text.insert(tk.END, f"X = ({mean_value:.6f} ± {ue:.6f})")
-            
-            # 更新图表
-            self.update_plot()
-            
+            self.result_text.insert(tk.END, "正在计算...\n")
+            self.root.after(50, self.poll_uncertainty, future, settings[3])
+            return
+        
+        # 计算A类、B类、合成及扩展不确定度
+        try:
+            result = calculate_uncertainty(self.data_values, *settings)
+        except ValueError as e:
+            messagebox.showerror("计算错误", f"计算过程中出现错误: {str(e)}")
+            return
+        self.apply_result(result, settings[3])
+    
+    def poll_uncertainty(self, future, confidence_level):
+        """轮询计算服务的不确定度请求，完成后显示结果"""
+        if not future.done():
+            self.root.after(50, self.poll_uncertainty, future, confidence_level)
+            return
+        
+        try:
+            result = future.result()
+        except ServiceError as e:
+            self.result_text.delete(1.0, tk.END)
+            messagebox.showerror("计算服务错误", f"计算服务拒绝了请求: {str(e)}")
+            return
+        except Exception as e:
+            self.result_text.delete(1.0, tk.END)
+            messagebox.showerror("计算错误", f"计算过程中出现错误: {str(e)}")
+            return
+        self.apply_result(result, confidence_level)
+    
+    def apply_result(self, result, confidence_level):
+        """保存不确定度结果，显示并更新图表"""
+        self.ua = result["ua"]
+        self.ub = result["ub"]
+        self.uc = result["uc"]
+        self.ue = result["ue"]
+        
+        # 显示结果
+        self.show_result(result, confidence_level)
+        
+        # 更新图表
+        self.update_plot()
+    
+    def calculate_file_uncertainty(self):
+        """对超出内存的数据文件（第一列）做分块流式计算，在后台线程中进行，不阻塞界面"""
+        try:
+            settings = self.read_settings()
         except ValueError:
-            messagebox.showerror("输入错误", "请确保仪器精度和置信系数为有效的数值")
+            messagebox.showerror("输入错误", "请确保仪器精度、置信系数和B类自由度为有效的数值")
+            return
+        
+        path = filedialog.askopenfilename(
+            title="选择数据文件",
+            filetypes=[("数据文件", "*.npy *.csv *.txt *.dat *.bin"), ("所有文件", "*.*")])
+        if not path:
+            return
+        
+        # 原始二进制文件按每行一个float64读取
+        future = self.stream_executor.submit(stream_uncertainty, path, 0, *settings, raw_columns=1,
+                                             cancel_event=self.stream_cancel)
+        self.result_text.delete(1.0, tk.END)
+        self.result_text.insert(tk.END, f"正在分块计算: {path}\n")
+        self.root.after(200, self.poll_file_uncertainty, future, path, settings[3])
+    
+    def poll_file_uncertainty(self, future, path, confidence_level):
+        """轮询后台流式计算，完成后显示结果"""
+        if not future.done():
+            self.root.after(200, self.poll_file_uncertainty, future, path, confidence_level)
+            return
+        
+        try:
+            result = future.result()
+        except Exception as e:
+            self.result_text.delete(1.0, tk.END)
+            messagebox.showerror("计算错误", f"文件计算过程中出现错误: {str(e)}")
+            return
+        self.show_result(result, confidence_level, source=path)
+    
+    def open_sweep_window(self):
+        """打开参数扫描窗口"""
+        if len(self.data_values) < 2:
+            messagebox.showwarning("数据不足", "至少需要2个数据点才能进行参数扫描")
+            return
+        
+        UncertaintySweepWindow(self.root, np.std(self.data_values, ddof=1), len(self.data_values),
+                               self.distribution_var.get())
+    
+    def on_close(self):
+        """关闭窗口时关闭后台线程、计算服务连接，合并会话日志并关闭会话"""
+        self.stream_cancel.set()
+        self.stream_executor.shutdown(wait=False, cancel_futures=True)
+        self.compute_executor.shutdown(wait=False, cancel_futures=True)
+        # 等待后台合并完成，再合并剩余的日志
+        if self.session.needs_compaction:
+            self.session.compact()
+        self.session.close()
+        if self.compute_client is not None:
+            self.compute_client.close()
+        self.root.destroy()
+
+class UncertaintySweepWindow:
+    """不确定度参数扫描窗口：横轴为仪器精度，纵轴为置信系数k或样本数量n"""
+    
+    def __init__(self, master, std_dev, n, distribution):
+        self.std_dev = std_dev
+        self.n = n
+        
+        self.window = tk.Toplevel(master)
+        self.window.title("不确定度参数扫描")
+        self.window.geometry("900x750")
+        
+        # 扫描参数输入
+        control_frame = ttk.LabelFrame(self.window, text="扫描参数（起始 / 终止 / 点数）", padding="10")
+        control_frame.pack(fill=tk.X, padx=10, pady=5)
+        
+        self.range_entries = {}
+        defaults = {
+            "precision": ("仪器精度:", (0.0, 1.0, 500)),
+            "k": ("置信系数k:", (1.0, 3.0, 500)),
+            "n": ("样本数量n:", (2, max(50, 2 * n), 100)),
+        }
+        for row, (key, (text, values)) in enumerate(defaults.items()):
+            ttk.Label(control_frame, text=text).grid(row=row, column=0, sticky=tk.W, pady=2)
+            entries = []
+            for col, value in enumerate(values):
+                entry = ttk.Entry(control_frame, width=12)
+                entry.grid(row=row, column=col + 1, padx=5, pady=2)
+                entry.insert(0, str(value))
+                entries.append(entry)
+            self.range_entries[key] = entries
+        
+        ttk.Label(control_frame, text="B类不确定度分布:").grid(row=3, column=0, sticky=tk.W, pady=2)
+        self.distribution_var = tk.StringVar(value=distribution)
+        distribution_combobox = ttk.Combobox(control_frame, textvariable=self.distribution_var,
+                                             values=list(DISTRIBUTION_DIVISORS), width=10)
+        distribution_combobox.grid(row=3, column=1, padx=5, pady=2)
+        distribution_combobox.state(["readonly"])
+        
+        ttk.Label(control_frame, text="纵轴参数:").grid(row=3, column=2, sticky=tk.W, pady=2)
+        self.y_axis_var = tk.StringVar(value="置信系数k")
+        y_axis_combobox = ttk.Combobox(control_frame, textvariable=self.y_axis_var,
+                                       values=["置信系数k", "样本数量n"], width=10)
+        y_axis_combobox.grid(row=3, column=3, padx=5, pady=2)
+        y_axis_combobox.state(["readonly"])
+        
+        ttk.Button(control_frame, text="扫描", command=self.run_sweep).grid(row=3, column=4, padx=10)
+        ttk.Label(control_frame, text=f"（样本标准差s = {std_dev:.6f}，当前n = {n}，纵轴为k时n取当前值，为n时k取终止值）").grid(
+            row=4, column=0, columnspan=5, sticky=tk.W, pady=2)
+        
+        # 热力图
+        self.fig = Figure(figsize=(7, 5), dpi=100)
+        self.canvas = FigureCanvasTkAgg(self.fig, master=self.window)
+        self.canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
+        
+        toolbar_frame = ttk.Frame(self.window)
+        toolbar_frame.pack(fill=tk.X)
+        toolbar = NavigationToolbar2Tk(self.canvas, toolbar_frame)
+        toolbar.update()
+        
+        self.run_sweep()
+    
+    def read_range(self, key):
+        """读取一行扫描范围，返回 (起始, 终止, 点数)"""
+        start, stop, count = (entry.get() for entry in self.range_entries[key])
+        count = int(count)
+        if count < 2:
+            raise ValueError("点数至少为2")
+        return float(start), float(stop), count
+    
+    def run_sweep(self):
+        """计算整个参数网格并绘图"""
+        try:
+            precisions = np.linspace(*self.read_range("precision"))
+            k_start, k_stop, k_count = self.read_range("k")
+            if self.y_axis_var.get() == "样本数量n":
+                n_start, n_stop, n_count = self.read_range("n")
+                sample_sizes = np.unique(np.linspace(max(n_start, 2), n_stop, n_count).round())
+                if len(sample_sizes) < 2:
+                    raise ValueError("样本数量n的范围过小")
+                factors = [k_stop]
+            else:
+                sample_sizes = [self.n]
+                factors = np.linspace(k_start, k_stop, k_count)
+        except ValueError as e:
+            messagebox.showerror("输入错误", f"请检查扫描参数: {str(e)}", parent=self.window)
+            return
+        
+        distribution = self.distribution_var.get()
+        start = time.perf_counter()
+        result = uncertainty_sweep(self.std_dev, sample_sizes, precisions, [distribution], factors)
+        elapsed = (time.perf_counter() - start) * 1000
+        
+        # 取出 (纵轴, 仪器精度) 平面
+        if len(sample_sizes) > 1:
+            y_values, y_label = sample_sizes, "样本数量n"
+            expanded = result["U"][:, :, 0, 0]
+        else:
+            y_values, y_label = factors, "置信系数k"
+            expanded = result["U"][0, :, 0, :].T
+        
+        self.fig.clear()
+        ax = self.fig.add_subplot(111)
+        mesh = ax.pcolormesh(precisions, y_values, expanded, shading="auto", cmap="viridis")
+        contours = ax.contour(precisions, y_values, expanded, levels=8, colors="white", linewidths=0.8)
+        ax.clabel(contours, fontsize=8, fmt="%.3g")
+        self.fig.colorbar(mesh, ax=ax, label="扩展不确定度U")
+        ax.set_xlabel("仪器精度")
+        ax.set_ylabel(y_label)
+        ax.set_title(f"扩展不确定度U（{distribution}，{expanded.size}个组合，耗时{elapsed:.1f} ms）", fontsize=11)
+        self.canvas.draw()
+
 
 def main():
     root = tk.Tk()